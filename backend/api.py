@@ -4,41 +4,334 @@ Tomato Varieties Database API
 Flask backend for serving tomato variety data
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import json
+import gzip
 import os
+import time
+from concurrent import futures
 from datetime import datetime
+from itertools import islice
+from data_watcher import DataWatcher, file_signature
+from dataset import decode_cursor, encode_cursor, parse_fields, project
+import serializer
+from facet_index import bitmap_ids, iter_bitmap_ids, popcount
+from metrics import LATENCY_BUCKETS, LOAD_BUCKETS, SIZE_BUCKETS, MetricsRegistry
+from profiling import TOKEN_HEADER, RequestProfiler
+from range_index import RANGE_FIELDS
+from single_flight import SingleFlight
+from storage import BACKENDS, backend_file
+from variety_store import to_plain
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without brotli, clients are offered gzip only
+    brotli = None
+
+class CatalogueJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes through serializer.py (orjson when installed)
+    and also serializes the compact variety records"""
+
+    @staticmethod
+    def default(o):
+        try:
+            return to_plain(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        return self.encode(obj, bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return serializer.loads(s)
+
+    def encode(self, obj, indent=False):
+        """Serialize obj to UTF-8 bytes, keys sorted like Flask's default provider"""
+        return serializer.dumps(obj, sort_keys=self.sort_keys, indent=indent, default=self.default)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = CatalogueJSONProvider(app)
 CORS(app)
 
-# Global variable to cache tomato data
-tomato_data = None
+# Storage backend ("memory", "sqlite" or "mmap", see storage.py) and the file it reads
+STORAGE_BACKEND = os.environ.get('TOMATO_STORAGE', 'memory')
+DATA_FILE = backend_file(STORAGE_BACKEND)
+# Seconds between checks of DATA_FILE for changes
+WATCH_INTERVAL = float(os.environ.get('TOMATO_WATCH_INTERVAL', '2'))
+# Seconds /refresh waits for the rebuild before answering 202 and letting it
+# finish in the background; keep it below the server's worker timeout
+REFRESH_WAIT = float(os.environ.get('TOMATO_REFRESH_WAIT', '20'))
 
-def load_tomato_data():
-    """Load tomato varieties data from JSON file"""
-    global tomato_data
-    
-    if tomato_data is not None:
-        return tomato_data
-    
+# Upper bound for ?limit= on paginated endpoints
+MAX_PAGE_SIZE = 1000
+# Results per /search response when no ?limit= is given
+DEFAULT_SEARCH_LIMIT = 50
+# Varieties fetched and serialized per chunk of an NDJSON export
+EXPORT_CHUNK_SIZE = 500
+# Completions per /suggest response by default and at most
+DEFAULT_SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+# Time allowed for verifying fuzzy name candidates per /search?fuzzy=1 query
+FUZZY_BUDGET_MS = float(os.environ.get('TOMATO_FUZZY_BUDGET_MS', '5'))
+# Query parameters of list endpoints that are not filters
+LIST_PARAMS = ('fields', 'limit', 'cursor')
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+# encoding -> compress(body, best). Pinned bodies are compressed once per
+# version at the best level; others may be evicted and compressed again, so
+# they use a cheap level instead
+COMPRESSORS = {'gzip': lambda body, best: gzip.compress(body, compresslevel=9 if best else 1,
+                                                        mtime=0)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body, best: brotli.compress(body, quality=9 if best else 4)
+
+# Opt-in request profiling (see profiling.py): requests sent with this token in
+# the X-Profile-Token header, and this share of all requests, are profiled.
+# Stored profiles are only served to the token, so without one the
+# middleware is not installed at all, even if a sample rate is set.
+PROFILE_TOKEN = os.environ.get('TOMATO_PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('TOMATO_PROFILE_SAMPLE_RATE', '0'))
+profiler = None
+if PROFILE_TOKEN:
+    profiler = RequestProfiler(app.wsgi_app, PROFILE_TOKEN, PROFILE_SAMPLE_RATE)
+    app.wsgi_app = profiler
+elif PROFILE_SAMPLE_RATE > 0:
+    print("⚠️  TOMATO_PROFILE_SAMPLE_RATE ignored: set TOMATO_PROFILE_TOKEN to enable profiling")
+
+# Current dataset snapshot: the loaded data plus every index built from it.
+# Replaced as a whole on refresh so requests never see a half-built state.
+dataset = None
+data_watcher = None
+# Coalesces concurrent loads so the file is parsed once per (re)load
+dataset_loader = SingleFlight()
+# Runs /refresh rebuilds, one at a time, outside the request that asked for them
+refresh_executor = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='dataset-refresh')
+
+def dataset_gauge(value):
+    """Gauge collector reporting value(dataset) once a dataset is loaded"""
+    return lambda totals: [] if dataset is None else [value(dataset)]
+
+def cache_hit_ratio(totals):
+    hits = totals.total('tomato_response_cache_hits_total')
+    lookups = hits + totals.total('tomato_response_cache_misses_total')
+    return [((), hits / lookups if lookups else 0.0)]
+
+# Per-process metrics exposed at /metrics
+metrics = MetricsRegistry()
+metrics.counter('tomato_http_requests_total', 'HTTP requests by route, method and status')
+metrics.histogram('tomato_http_request_duration_seconds',
+                  'Time to produce a response, by route', LATENCY_BUCKETS)
+metrics.histogram('tomato_http_response_size_bytes',
+                  'Response body size, by route (streamed responses excluded)', SIZE_BUCKETS)
+metrics.histogram('tomato_dataset_load_duration_seconds',
+                  'Time to read the data file and build a snapshot, by trigger', LOAD_BUCKETS)
+metrics.counter('tomato_dataset_load_failures_total', 'Failed dataset loads, by trigger')
+metrics.counter('tomato_response_cache_hits_total', 'Response bodies served from the cache')
+metrics.counter('tomato_response_cache_misses_total', 'Response bodies serialized on a cache miss')
+metrics.gauge('tomato_response_cache_hit_ratio',
+              'Share of response cache lookups that were hits', cache_hit_ratio)
+metrics.gauge('tomato_dataset_varieties', 'Varieties in the current dataset',
+              dataset_gauge(lambda current: ((), len(current))))
+metrics.gauge('tomato_dataset_info', 'Version and storage backend of the current dataset',
+              dataset_gauge(lambda current: ((('version', current.version),
+                                              ('backend', STORAGE_BACKEND)), 1)))
+
+def read_dataset(previous=None):
+    """Read the JSON file and build a new dataset snapshot
+
+    Returns a (dataset, error) pair where error is a JSON-ready dict. The
+    snapshot records the file's signature from before the read, so a watcher
+    started later (e.g. in a forked worker) notices any write since.
+    """
+    open_dataset, _, missing_hint = BACKENDS[STORAGE_BACKEND]
     try:
-        if os.path.exists('tomato_varieties.json'):
-            with open('tomato_varieties.json', 'r', encoding='utf-8') as f:
-                tomato_data = json.load(f)
-                return tomato_data
+        signature = file_signature(DATA_FILE)
+        if signature is not None:
+            current = open_dataset(DATA_FILE, previous)
+            current.file_signature = signature
+            return current, None
         else:
-            return {
+            return None, {
                 "error": "Data file not found",
-                "message": "Please run the scraper first: python scraper.py"
+                "message": missing_hint
             }
     except Exception as e:
-        return {
+        return None, {
             "error": "Failed to load data",
             "message": str(e)
         }
 
+def publish_dataset(initial_only=False):
+    """Read the file and publish the new snapshot; runs inside dataset_loader"""
+    global dataset
+    
+    previous = dataset
+    if initial_only and previous is not None:
+        # Another flight finished loading between our check and this call
+        return previous, None
+    
+    trigger = (('trigger', 'initial' if previous is None else 'refresh'),)
+    started = time.perf_counter()
+    current, error = read_dataset(previous)
+    metrics.observe('tomato_dataset_load_duration_seconds', time.perf_counter() - started, trigger)
+    if error:
+        metrics.increment('tomato_dataset_load_failures_total', trigger)
+    if current is not None:
+        dataset = current
+    return current, error
+
+def load_dataset():
+    """Return the current dataset snapshot, loading it on first use
+
+    Concurrent first requests wait for a single load instead of each
+    parsing the file.
+    """
+    current = dataset
+    if current is not None:
+        return current, None
+    
+    return dataset_loader.do(lambda: publish_dataset(initial_only=True))
+
+def reload_dataset():
+    """Rebuild the snapshot from disk and publish it with one reference swap
+
+    The current snapshot keeps serving requests while the new one is built;
+    on failure it stays in place. Concurrent reloads share one read.
+    Returns the (dataset, error) pair.
+    """
+    return dataset_loader.do(publish_dataset)
+
+def start_data_watcher(interval=WATCH_INTERVAL):
+    """Load the data and start reloading it in the background when the file changes"""
+    global data_watcher
+    
+    if data_watcher is None:
+        current, _ = load_dataset()
+        
+        def on_change():
+            current, error = reload_dataset()
+            if error:
+                print(f"⚠️  Reload of {DATA_FILE} failed: {error['message']}")
+                return False
+            print(f"🔄 Reloaded {len(current)} varieties from {DATA_FILE}")
+            return True
+        
+        # Seed with the file as it was when the snapshot was read, not as it is
+        # now: a worker forked from a preloaded master may hold stale data
+        seen = current.file_signature if current is not None else None
+        data_watcher = DataWatcher(DATA_FILE, on_change, interval, seen).start()
+    return data_watcher
+
+def load_tomato_data():
+    """Load tomato varieties data from JSON file"""
+    current, error = load_dataset()
+    if error:
+        return error
+    return {**current.metadata, "varieties": current.all_varieties()}
+
+def cache_body(current, cache_key, build_body, pinned=False):
+    """Return a body from the dataset's response cache, building it on a miss"""
+    body = current.response_cache.get(cache_key)
+    if body is None:
+        metrics.increment('tomato_response_cache_misses_total')
+        body = build_body()
+        current.response_cache.put(cache_key, body, pinned)
+    else:
+        metrics.increment('tomato_response_cache_hits_total')
+    return body
+
+def cached_response(current, cache_key, build_payload, pinned=False):
+    """Return a JSON response whose body is serialized once per data version
+
+    The ETag is the dataset version, suffixed with the content encoding for
+    compressed bodies, so a conditional request made before the next refresh
+    is answered with 304 Not Modified and no body. Large bodies are also
+    compressed for each negotiated encoding. `pinned` bodies (the hot
+    catalogue-sized ones) and their compressed copies are never evicted.
+    """
+    variants = [current.version] + [f'{current.version}-{e}' for e in COMPRESSORS]
+    matched = next((tag for tag in variants if request.if_none_match.contains(tag)), None)
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+    else:
+        body = cache_body(current, cache_key,
+                          lambda: app.json.encode(build_payload()) + b'\n', pinned)
+        encoding = None
+        if len(body) >= MIN_COMPRESS_SIZE:
+            encoding = request.accept_encodings.best_match(list(COMPRESSORS))
+        
+        if encoding:
+            body = cache_body(current, (cache_key, encoding),
+                              lambda: COMPRESSORS[encoding](body, pinned), pinned)
+            response = app.response_class(body, mimetype='application/json')
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f'{current.version}-{encoding}')
+        else:
+            response = app.response_class(body, mimetype='application/json')
+            response.set_etag(current.version)
+    
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def parse_filters(facet_index, ignored):
+    """Split the query args into facet predicates and numeric range bounds
+
+    Returns (predicates, bounds, error) where error is a 400 response for an
+    unknown or malformed parameter. Parameters in `ignored` are skipped.
+    """
+    predicates = {}
+    bounds = {}
+    for param in request.args:
+        if param in ignored:
+            continue
+        field, _, bound = param.rpartition('_')
+        if field in RANGE_FIELDS and bound in ('min', 'max'):
+            try:
+                value = float(request.args[param])
+            except ValueError:
+                return None, None, (jsonify({
+                    "error": "Invalid range",
+                    "message": f"{param} must be a number"
+                }), 400)
+            minimum, maximum = bounds.get(field, (None, None))
+            bounds[field] = (value, maximum) if bound == 'min' else (minimum, value)
+        elif param in facet_index.bitmaps:
+            predicates[param] = request.args.getlist(param)
+        else:
+            return None, None, (jsonify({
+                "error": "Unknown filter",
+                "message": f"Cannot filter on '{param}'. Available facets: "
+                           f"{', '.join(facet_index.bitmaps)}; ranges: "
+                           f"{', '.join(f'{f}_min/{f}_max' for f in RANGE_FIELDS)}"
+            }), 400)
+    return predicates, bounds, None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and record its latency and body size by route"""
+    elapsed = time.perf_counter() - g.request_started
+    # The rule pattern, not the URL, keeps one series per endpoint
+    route = (('route', request.url_rule.rule if request.url_rule else 'unmatched'),)
+    metrics.increment('tomato_http_requests_total',
+                      route + (('method', request.method), ('status', str(response.status_code))))
+    metrics.observe('tomato_http_request_duration_seconds', elapsed, route)
+    if response.content_length is not None:
+        metrics.observe('tomato_http_response_size_bytes', response.content_length, route)
+    return response
+
 @app.route('/')
 def home():
     """API home endpoint"""
@@ -46,11 +339,17 @@ def home():
         "message": "Tomato Varieties Database API",
         "version": "1.0",
         "endpoints": {
-            "/varieties": "Get all tomato varieties",
+            "/varieties": "Get all tomato varieties (?fields=, ?limit=&cursor=)",
+            "/varieties/filter?<facet>=<value>": "Filter varieties by characteristics with facet counts",
+            "/varieties/export.ndjson": "Stream varieties as NDJSON (?fields= and filters as /varieties/filter)",
+            "/varieties/batch": "POST {\"names\": [...]} to get several varieties at once",
             "/variety/<name>": "Get specific variety by name",
-            "/search?q=<query>": "Search varieties",
+            "/search?q=<query>": "Search varieties, most relevant first (supports ?limit=&offset=)",
+            "/suggest?prefix=<text>": "Autocomplete variety names and characteristic values",
             "/stats": "Get database statistics",
             "/refresh": "Refresh data from file",
+            "/metrics": "Request, cache and dataset metrics (Prometheus text format)",
+            "/profiles/<id>": "Profile of a request run with profiling enabled",
             "/scrape": "Start scraper (POST)",
             "/scrape/status": "Check scraper status"
         }
@@ -58,39 +357,206 @@ def home():
 
 @app.route('/varieties')
 def get_varieties():
-    """Get all tomato varieties"""
-    data = load_tomato_data()
+    """Get tomato varieties, optionally projected and paginated
+
+    ?fields=a,b selects top-level fields (default: a summary without raw_text
+    and images; "all" for full records). ?limit=&cursor= pages through the
+    catalogue in slug order; each page returns the next_cursor to continue.
+    """
+    current, error = load_dataset()
+    
+    if error:
+        return jsonify(error), 500
+    
+    fields = parse_fields(request.args.get('fields', ''))
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    paginated = limit is not None or cursor is not None
     
-    if 'error' in data:
-        return jsonify(data), 500
+    if paginated:
+        try:
+            limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({
+                "error": "Invalid pagination parameters",
+                "message": str(e)
+            }), 400
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({
+                "error": "Invalid pagination parameters",
+                "message": f"limit must be between 1 and {MAX_PAGE_SIZE}"
+            }), 400
+    
+    def build_payload():
+        payload = dict(current.metadata)
+        if paginated:
+            varieties, next_key = current.page(limit, after)
+            payload["next_cursor"] = encode_cursor(next_key) if next_key else None
+        else:
+            varieties = current.all_varieties()
+        payload["varieties"] = [project(v, fields) for v in varieties]
+        return payload
+    
+    if paginated:
+        return cached_response(current, ('varieties', fields, limit, cursor), build_payload)
+    # The full catalogue in the default or "all" projection is the hottest, largest body
+    pinned = fields is None or fields == parse_fields('')
+    return cached_response(current, ('varieties', fields), build_payload, pinned)
+
+@app.route('/varieties/filter')
+def filter_varieties():
+    """Filter varieties by characteristic facets and numeric ranges
+
+    e.g. ?tomato_type=Cherry&season=Early&season=Mid - repeated values of a
+    field are ORed, different fields are ANDed. Numeric fields take
+    <field>_min/<field>_max (days, feet for plant_height, ounces for fruit
+    size/weight) and match varieties whose range overlaps the bounds.
+    Returns the matches plus per-facet option counts. Supports ?fields= and
+    ?limit= like /varieties.
+    """
+    current, error = load_dataset()
+    
+    if error:
+        return jsonify(error), 500
+    
+    facet_index = current.facet_index
+    predicates, bounds, error = parse_filters(facet_index, LIST_PARAMS)
+    if error:
+        return error
+    
+    fields = parse_fields(request.args.get('fields', ''))
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({
+                "error": "Invalid pagination parameters",
+                "message": f"limit must be between 1 and {MAX_PAGE_SIZE}"
+            }), 400
+    
+    def build_payload():
+        restrict = current.range_index.filter(bounds) if bounds else None
+        matches, facets = facet_index.filter(predicates, restrict)
+        varieties = current.get_varieties(bitmap_ids(matches, limit))
+        return {
+            "filters": predicates,
+            "ranges": {field: {"min": lo, "max": hi} for field, (lo, hi) in bounds.items()},
+            "varieties": [project(v, fields) for v in varieties],
+            "total_results": popcount(matches),
+            "facets": facets
+        }
+    
+    cache_key = ('filter', tuple(sorted((f, tuple(v)) for f, v in predicates.items())),
+                 tuple(sorted(bounds.items())), fields, limit)
+    return cached_response(current, cache_key, build_payload)
+
+@app.route('/varieties/batch', methods=['POST'])
+def get_varieties_batch():
+    """Get several varieties by name or slug in one request
+
+    Takes a JSON body {"names": [...]} (and optionally "fields" like ?fields=).
+    Results follow the order of the names; names that match nothing come
+    back with "found": false and are listed under "not_found".
+    """
+    body = request.get_json(silent=True)
+    names = body.get('names') if isinstance(body, dict) else None
+    
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return jsonify({
+            "error": "Invalid request body",
+            "message": 'Please provide a JSON body like {"names": ["Sun Gold", "brandywine"]}'
+        }), 400
+    if len(names) > MAX_PAGE_SIZE:
+        return jsonify({
+            "error": "Too many names",
+            "message": f"At most {MAX_PAGE_SIZE} names can be requested at once"
+        }), 400
+    
+    current, error = load_dataset()
+    
+    if error:
+        return jsonify(error), 500
+    
+    # Full records by default, like /variety/<name>
+    fields = body.get('fields') or request.args.get('fields', 'all')
+    fields = parse_fields(','.join(fields) if isinstance(fields, list) else str(fields))
+    # Resolve every name through the name index, then fetch the matches together
+    doc_ids = [current.lookup(name) for name in names]
+    found = current.get_varieties([doc_id for doc_id in doc_ids if doc_id is not None])
+    varieties = iter(found)
+    
+    results = []
+    not_found = []
+    for name, doc_id in zip(names, doc_ids):
+        if doc_id is None:
+            results.append({"name": name, "found": False})
+            not_found.append(name)
+        else:
+            results.append({"name": name, "found": True,
+                            "variety": project(next(varieties), fields)})
     
     return jsonify({
-        "varieties": data.get('varieties', []),
-        "total_count": data.get('total_count', 0),
-        "scraped_at": data.get('scraped_at', ''),
-        "source": data.get('source', '')
+        "results": results,
+        "total_found": len(found),
+        "not_found": not_found
     })
 
+@app.route('/varieties/export.ndjson')
+def export_varieties():
+    """Stream the catalogue as newline-delimited JSON, one variety per line
+
+    Takes the same ?fields= projection and facet/range filters as
+    /varieties/filter. Varieties are fetched and serialized a chunk at a
+    time, so neither side has to buffer the whole catalogue.
+    """
+    current, error = load_dataset()
+    
+    if error:
+        return jsonify(error), 500
+    
+    predicates, bounds, error = parse_filters(current.facet_index, ('fields',))
+    if error:
+        return error
+    fields = parse_fields(request.args.get('fields', ''))
+    
+    if predicates or bounds:
+        restrict = current.range_index.filter(bounds) if bounds else None
+        matches, _ = current.facet_index.filter(predicates, restrict)
+        doc_ids = iter_bitmap_ids(matches)
+    else:
+        doc_ids = iter(range(len(current)))
+    
+    def generate():
+        # The snapshot captured above stays in use even if a refresh lands mid-stream
+        while True:
+            chunk = list(islice(doc_ids, EXPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            yield b''.join(app.json.encode(project(v, fields)) + b'\n'
+                           for v in current.get_varieties(chunk))
+    
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.set_etag(current.version)
+    return response
+
 @app.route('/variety/<variety_name>')
 def get_variety(variety_name):
     """Get specific variety by name"""
-    data = load_tomato_data()
-    
-    if 'error' in data:
-        return jsonify(data), 500
+    current, error = load_dataset()
     
-    varieties = data.get('varieties', [])
+    if error:
+        return jsonify(error), 500
     
-    # Search by name or slug
-    variety = None
-    for v in varieties:
-        if (v.get('name', '').lower() == variety_name.lower() or 
-            v.get('slug', '').lower() == variety_name.lower()):
-            variety = v
-            break
+    # Search by name or slug through the case-folded name index
+    doc_id = current.lookup(variety_name)
     
-    if variety:
-        return jsonify(variety)
+    if doc_id is not None:
+        return cached_response(current, ('variety', doc_id),
+                               lambda: current.variety(doc_id))
     else:
         return jsonify({
             "error": "Variety not found",
@@ -99,8 +565,15 @@ def get_variety(variety_name):
 
 @app.route('/search')
 def search_varieties():
-    """Search varieties by query"""
+    """Search varieties by query, most relevant first
+
+    Matches are varieties whose name, description or characteristics contain
+    the query, ranked by BM25 with name matches weighted highest. ?limit= and
+    ?offset= page through the ranking. ?fuzzy=1 also returns varieties whose
+    name or slug is within a few typos of the query, after the exact matches.
+    """
     query = request.args.get('q', '').strip().lower()
+    fuzzy = request.args.get('fuzzy', '').lower() in ('1', 'true', 'yes')
     
     if not query:
         return jsonify({
@@ -108,87 +581,165 @@ def search_varieties():
             "message": "Please provide a search query using ?q=<query>"
         }), 400
     
-    data = load_tomato_data()
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        limit = offset = -1
+    if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+        return jsonify({
+            "error": "Invalid pagination parameters",
+            "message": f"limit must be between 1 and {MAX_PAGE_SIZE} and offset at least 0"
+        }), 400
     
-    if 'error' in data:
-        return jsonify(data), 500
+    current, error = load_dataset()
     
-    varieties = data.get('varieties', [])
-    results = []
+    if error:
+        return jsonify(error), 500
     
-    for variety in varieties:
-        # Search in name, description, and characteristics
-        searchable_text = ' '.join([
-            variety.get('name', ''),
-            variety.get('description', ''),
-            ' '.join(variety.get('characteristics', {}).values()),
-            ' '.join(variety.get('growing_info', {}).values())
-        ]).lower()
-        
-        if query in searchable_text:
-            results.append(variety)
+    # Only the top offset + limit matches are scored into order
+    ranked, total = current.rank(query, offset + limit)
+    ranked = ranked[offset:]
+    response = {"query": query}
     
-    return jsonify({
-        "query": query,
+    if fuzzy:
+        matches, truncated = current.fuzzy_index.search(query, FUZZY_BUDGET_MS)
+        exact = set(current.search_ids(query))
+        fuzzy_ids = [doc_id for doc_id, _ in matches if doc_id not in exact]
+        # Fuzzy matches rank after every exact match, with no relevance score
+        fuzzy_offset = max(0, offset - total)
+        ranked += [(doc_id, 0.0) for doc_id in fuzzy_ids[fuzzy_offset:]]
+        ranked = ranked[:limit]
+        total += len(fuzzy_ids)
+        response["fuzzy_results"] = len(fuzzy_ids)
+        response["fuzzy_truncated"] = truncated
+    
+    varieties = current.get_varieties([doc_id for doc_id, _ in ranked])
+    results = [{**variety, "relevance_score": score}
+               for variety, (_, score) in zip(varieties, ranked)]
+    
+    response.update({
         "results": results,
-        "total_results": len(results),
+        "total_results": total,
+        "limit": limit,
+        "offset": offset,
         "searched_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
+    return jsonify(response)
+
+@app.route('/suggest')
+def suggest_completions():
+    """Complete a partial query for search-as-you-type
+
+    Returns variety names and characteristic values starting with ?prefix=,
+    from an index built at load time. ?limit= caps the completions.
+    """
+    prefix = request.args.get('prefix', '').strip()
+    
+    if not prefix:
+        return jsonify({
+            "error": "No prefix provided",
+            "message": "Please provide a prefix using ?prefix=<text>"
+        }), 400
+    
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGEST_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+        return jsonify({
+            "error": "Invalid limit",
+            "message": f"limit must be between 1 and {MAX_SUGGEST_LIMIT}"
+        }), 400
+    
+    current, error = load_dataset()
+    
+    if error:
+        return jsonify(error), 500
+    
+    return jsonify({
+        "prefix": prefix,
+        "suggestions": current.suggest_index.suggest(prefix, limit)
+    })
 
 @app.route('/stats')
 def get_stats():
     """Get database statistics"""
-    data = load_tomato_data()
-    
-    if 'error' in data:
-        return jsonify(data), 500
-    
-    varieties = data.get('varieties', [])
-    
-    # Calculate statistics
-    stats = {
-        "total_varieties": len(varieties),
-        "scraped_at": data.get('scraped_at', ''),
-        "source": data.get('source', ''),
-        "characteristics_stats": {},
-        "growing_info_stats": {}
-    }
-    
-    # Count characteristics
-    char_counts = {}
-    growing_counts = {}
-    
-    for variety in varieties:
-        # Count characteristics
-        for key in variety.get('characteristics', {}).keys():
-            char_counts[key] = char_counts.get(key, 0) + 1
-        
-        # Count growing info
-        for key in variety.get('growing_info', {}).keys():
-            growing_counts[key] = growing_counts.get(key, 0) + 1
+    current, error = load_dataset()
     
-    stats['characteristics_stats'] = char_counts
-    stats['growing_info_stats'] = growing_counts
+    if error:
+        return jsonify(error), 500
     
-    return jsonify(stats)
+    # Computed once per data version when the snapshot was built
+    return cached_response(current, ('stats',), lambda: current.stats_payload, pinned=True)
 
 @app.route('/refresh')
 def refresh_data():
-    """Refresh the tomato data by reloading from file"""
-    global tomato_data
-    tomato_data = None  # Clear cache
+    """Refresh the tomato data by reloading from file
 
-    data = load_tomato_data()
+    Answers once the new snapshot is published, or with 202 after
+    REFRESH_WAIT seconds while a large catalogue is still being indexed.
+    """
+    # Build the new snapshot in the background; requests keep using the old one meanwhile
+    reload = refresh_executor.submit(reload_dataset)
+    try:
+        current, error = reload.result(timeout=REFRESH_WAIT)
+    except futures.TimeoutError:
+        return jsonify({
+            "message": "Refresh in progress; the new data is served once it is loaded",
+            "total_varieties": len(dataset) if dataset is not None else 0
+        }), 202
 
-    if 'error' in data:
-        return jsonify(data), 500
+    if error:
+        return jsonify(error), 500
 
     return jsonify({
         "message": "Data refreshed successfully",
-        "total_varieties": len(data.get('varieties', [])),
+        "total_varieties": len(current),
         "refreshed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     })
 
+@app.route('/metrics')
+def get_metrics():
+    """Request, cache and dataset metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def profile_access_error():
+    """Error response if stored profiles may not be read, else None"""
+    if profiler is None:
+        return jsonify({
+            "error": "Profiling disabled",
+            "message": "Set TOMATO_PROFILE_TOKEN to enable it"
+        }), 404
+    if not profiler.authorized(request.headers.get(TOKEN_HEADER)):
+        return jsonify({
+            "error": "Forbidden",
+            "message": f"Send the profiling token in the {TOKEN_HEADER} header"
+        }), 403
+    return None
+
+@app.route('/profiles')
+def list_profiles():
+    """Recently profiled requests, newest first"""
+    error = profile_access_error()
+    if error:
+        return error
+    return jsonify({"profiles": profiler.summaries()})
+
+@app.route('/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Top functions by cumulative time for one profiled request"""
+    error = profile_access_error()
+    if error:
+        return error
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({
+            "error": "Profile not found",
+            "message": f"No stored profile with id '{profile_id}'"
+        }), 404
+    return jsonify(profile)
+
 @app.route("/scrape", methods=["POST"])
 def start_scraper():
     """Start the scraper to fetch fresh tomato data"""
@@ -264,12 +815,23 @@ if __name__ == '__main__':
     print("API will be available at: http://localhost:5000")
     print("Available endpoints:")
     print("   GET  /varieties           - All varieties")
+    print("   GET  /varieties/filter    - Faceted filtering")
+    print("   GET  /varieties/export.ndjson - Streaming NDJSON export")
+    print("   POST /varieties/batch     - Several varieties by name")
     print("   GET  /variety/<name>      - Specific variety")
     print("   GET  /search?q=<query>    - Search varieties")
+    print("   GET  /suggest?prefix=<t>  - Autocomplete")
     print("   GET  /stats               - Database statistics")
     print("   GET  /refresh             - Refresh data")
+    print("   GET  /metrics             - Prometheus metrics")
+    print("   GET  /profiles/<id>       - Stored request profile")
     print("   POST /scrape              - Start scraper")
     print("   GET  /scrape/status       - Scraper status")
     print("")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    debug = True
+    # With the debug reloader only the child process serves requests
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_data_watcher()
+    
+    app.run(debug=debug, host='0.0.0.0', port=5000)
\ No newline at end of file
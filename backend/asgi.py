@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for the Tomato Varieties API
+Serves the same Flask endpoints and dataset as api.py from an asyncio server:
+connections, request bodies and response writes are handled on the event
+loop, and only the endpoint code itself runs on a bounded thread pool, so
+thousands of idle keep-alive connections or slow clients hold no threads
+
+Run with: uvicorn asgi:app --workers 4
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+
+# Threads running endpoint code; requests beyond this wait on the event loop
+EXECUTOR_THREADS = int(os.environ.get('TOMATO_ASGI_THREADS', min(32, (os.cpu_count() or 1) * 4)))
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix='asgi-worker')
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope and its body into a WSGI environ"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def call_wsgi(environ):
+    """Run the Flask app; returns (status, headers, body)
+
+    Responses with a Content-Length are already in memory and come back as
+    a list; generator responses come back as their unconsumed iterator.
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                              for name, value in headers]
+
+    iterable = api.app.wsgi_app(environ, start_response)
+    if any(name == b'content-length' for name, _ in started['headers']):
+        try:
+            return started['status'], started['headers'], list(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+    return started['status'], started['headers'], iterable
+
+
+async def lifespan(receive, send):
+    """Load the dataset and start the file watcher before accepting requests"""
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await loop.run_in_executor(executor, api.start_data_watcher)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application wrapping api.app"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    # Read the whole request body on the event loop, not in a worker thread
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+
+    loop = asyncio.get_running_loop()
+    status, headers, body = await loop.run_in_executor(
+        executor, call_wsgi, build_environ(scope, b''.join(chunks)))
+    try:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if isinstance(body, (list, tuple)):
+            # Buffered response: writing it to a slow client needs no thread
+            for chunk in body:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        else:
+            # Streamed response (e.g. the NDJSON export): produce chunks on the pool
+            iterator = iter(body)
+            while True:
+                chunk = await loop.run_in_executor(executor, next, iterator, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            await loop.run_in_executor(executor, body.close)
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the Tomato Varieties API
+Replays a seeded mix of /variety/<name>, /search, /varieties (paged, full
+and filtered) and /stats requests through the Flask test client and a local threaded server (or any
+running server with --url), at several concurrency levels and dataset sizes,
+and reports p50/p95/p99 latency and throughput. Results can be written as
+JSON and compared with a previous run to catch regressions.
+
+Usage: python benchmark_api.py [tomato_varieties.json] [--sizes 500,5000]
+       [--concurrency 1,4,16] [--requests 2000] [--output results.json]
+       [--compare baseline.json]
+"""
+
+import argparse
+import http.client
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import api
+import serializer
+from dataset_image import build_image
+from sqlite_store import build_database
+
+# Share of requests per endpoint, roughly what the frontend sends. Each label
+# is reported separately: a full /varieties listing costs far more than a page.
+QUERY_MIX = (
+    ('/variety/<name>', 0.40),
+    ('/search', 0.35),
+    ('/varieties?limit=50', 0.09),
+    ('/varieties/filter', 0.03),
+    ('/varieties', 0.03),
+    ('/stats', 0.10),
+)
+# Facets used for /varieties/filter requests in the mix
+FILTER_FACETS = ('tomato_type', 'season')
+# Sent with every request, as browsers and the frontend's proxy do
+REQUEST_HEADERS = {'Accept-Encoding': 'gzip'}
+# Files each storage backend is built from the scaled JSON catalogue
+BUILDERS = {'memory': None, 'sqlite': build_database, 'mmap': build_image}
+
+WORD = re.compile(r'[a-z]{3,}')
+
+
+def scale(data, size):
+    """Return the catalogue with its varieties repeated under distinct names up to `size`"""
+    source = data.get('varieties', [])
+    varieties = []
+    for index in range(size):
+        variety = source[index % len(source)]
+        copy = index // len(source)
+        suffix = f' {copy + 1}' if copy else ''
+        varieties.append({**variety, 'name': variety.get('name', '') + suffix,
+                          'slug': variety.get('slug', '') + suffix.replace(' ', '-')})
+    return {**data, 'varieties': varieties, 'total_count': len(varieties)}
+
+
+def typo(word, rng):
+    """Swap two adjacent letters, as a hurried user would"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def build_query_mix(varieties, count, seed):
+    """Return `count` (endpoint, path) pairs drawn from QUERY_MIX
+
+    Lookups, search terms and filters come from the catalogue itself, with
+    search words weighted by how often they occur, so the mix keeps the
+    same shape as the dataset grows.
+    """
+    rng = random.Random(seed)
+    names = [v.get('name', '') for v in varieties if v.get('name')]
+    slugs = [v.get('slug', '') for v in varieties if v.get('slug')]
+    # Drawing from the list with repeats weights words by frequency
+    words = [word for v in varieties
+             for word in WORD.findall(f"{v.get('name', '')} {v.get('description', '')}".lower())]
+    words = words or ['tomato']
+    filters = sorted({(field, value) for v in varieties
+                      for field, value in (v.get('characteristics') or {}).items()
+                      if field in FILTER_FACETS and isinstance(value, str)})
+
+    def variety_path():
+        roll = rng.random()
+        if roll < 0.80:
+            return f"/variety/{quote(rng.choice(names), safe='')}"
+        if roll < 0.95:
+            return f"/variety/{quote(rng.choice(slugs), safe='')}"
+        return f"/variety/no-such-variety-{rng.randrange(1000)}"
+
+    def search_path():
+        roll = rng.random()
+        word = rng.choice(words)
+        if roll < 0.55:
+            query = word
+        elif roll < 0.80:
+            # Search-as-you-type: a prefix of a word
+            query = word[:rng.randint(3, len(word))]
+        elif roll < 0.90:
+            query = f'{word} {rng.choice(words)}'
+        else:
+            return f"/search?q={quote(typo(rng.choice(names).lower(), rng))}&fuzzy=1"
+        return f"/search?q={quote(query)}"
+
+    def filter_path():
+        field, value = rng.choice(filters)
+        return f"/varieties/filter?{field}={quote(value)}"
+
+    builders = {'/variety/<name>': variety_path, '/search': search_path,
+                '/varieties?limit=50': lambda: '/varieties?limit=50',
+                '/varieties/filter': filter_path, '/varieties': lambda: '/varieties',
+                '/stats': lambda: '/stats'}
+    # A catalogue without facet values has nothing to filter on
+    mix = [(endpoint, weight) for endpoint, weight in QUERY_MIX
+           if filters or endpoint != '/varieties/filter']
+    endpoints = [endpoint for endpoint, _ in mix]
+    weights = [weight for _, weight in mix]
+    return [(endpoint, builders[endpoint]())
+            for endpoint in rng.choices(endpoints, weights, k=count)]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def latency_summary(latencies):
+    """p50/p95/p99/mean/max of latencies in seconds, in milliseconds"""
+    values = sorted(latencies)
+    return {
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "mean": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "max": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def client_sender():
+    """Send requests in-process through Flask's test client"""
+    client = api.app.test_client()
+
+    def send(path):
+        response = client.get(path, headers=REQUEST_HEADERS)
+        size = len(response.data)
+        response.close()
+        return response.status_code, size
+    return send
+
+
+class HttpSender:
+    """Send requests over one keep-alive HTTP connection, reconnecting if it drops"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.connection = None
+
+    def __call__(self, path):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            self.connection.request('GET', path, headers=REQUEST_HEADERS)
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        if response.will_close:
+            self.connection.close()
+            self.connection = None
+        return response.status, len(body)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_local_server():
+    """Serve the app on a free local port from a background thread; returns the server"""
+    server = make_server('127.0.0.1', 0, api.app, threaded=True,
+                         request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_level(make_sender, paths, concurrency):
+    """Replay `paths` split across `concurrency` workers; returns the level's results"""
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+    # Workers connect first, then all start together with the clock
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(chunk):
+        send = make_sender()
+        samples = []
+        start.wait()
+        for endpoint, path in chunk:
+            began = time.perf_counter()
+            try:
+                status, size = send(path)
+            except (OSError, http.client.HTTPException):
+                status, size = None, 0
+            samples.append((endpoint, time.perf_counter() - began, status, size))
+        return samples
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker, chunk) for chunk in chunks]
+        start.wait()
+        began = time.perf_counter()
+        samples = [sample for future in futures for sample in future.result()]
+        elapsed = time.perf_counter() - began
+
+    statuses = Counter('error' if status is None else str(status) for _, _, status, _ in samples)
+    endpoints = {}
+    for endpoint, _ in QUERY_MIX:
+        latencies = [latency for name, latency, _, _ in samples if name == endpoint]
+        if latencies:
+            endpoint_statuses = Counter('error' if status is None else str(status)
+                                        for name, _, status, _ in samples if name == endpoint)
+            endpoints[endpoint] = {"requests": len(latencies),
+                                   "statuses": dict(sorted(endpoint_statuses.items())),
+                                   "latency_ms": latency_summary(latencies)}
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": sum(1 for _, _, status, _ in samples if status is None or status >= 500),
+        "statuses": dict(sorted(statuses.items())),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "bytes_received": sum(size for _, _, _, size in samples),
+        "latency_ms": latency_summary([latency for _, latency, _, _ in samples]),
+        "endpoints": endpoints,
+    }
+
+
+def run_target(mode, make_sender, paths, warmup, concurrency_levels, size):
+    """Warm up, then run every concurrency level against one target"""
+    run_level(make_sender, paths[:warmup], 1)
+    results = []
+    for concurrency in concurrency_levels:
+        result = {"mode": mode, "size": size, **run_level(make_sender, paths, concurrency)}
+        latency = result['latency_ms']
+        print(f"{mode:<8} {str(size):>9} {concurrency:>6} {result['throughput_rps']:>10.1f} "
+              f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f} "
+              f"{result['errors']:>7}")
+        results.append(result)
+    return results
+
+
+def load_size(data, size, backend, workdir):
+    """Write the catalogue scaled to `size` for `backend` and load it into the API
+
+    Returns (varieties, seconds the API took to load it)
+    """
+    scaled = scale(data, size)
+    json_path = os.path.join(workdir, f'varieties_{size}.json')
+    serializer.save_json(scaled, json_path)
+    data_file = json_path
+    if BUILDERS[backend] is not None:
+        data_file = os.path.join(workdir, f'varieties_{size}.{backend}')
+        BUILDERS[backend](json_path, data_file)
+
+    api.STORAGE_BACKEND = backend
+    api.DATA_FILE = data_file
+    api.dataset = None
+    began = time.perf_counter()
+    _, error = api.load_dataset()
+    if error:
+        raise RuntimeError(f"{error['error']}: {error['message']}")
+    return scaled['varieties'], time.perf_counter() - began
+
+
+def fetch_varieties(host, port):
+    """Names, slugs and descriptions from a running server, to build its query mix"""
+    connection = http.client.HTTPConnection(host, port, timeout=300)
+    connection.request('GET', '/varieties/export.ndjson?fields=name,slug,description,characteristics')
+    response = connection.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f"GET /varieties/export.ndjson returned {response.status}")
+    return [serializer.loads(line) for line in response.read().splitlines() if line]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold):
+    """Print how each level changed against a baseline run; returns the regression count"""
+    previous = {(r['mode'], r['size'], r['concurrency']): r for r in baseline.get('results', [])}
+    regressions = 0
+    print(f"\n📊 Compared with {baseline.get('git_commit') or 'baseline'} "
+          f"(regression: p95 or throughput worse by more than {threshold:.0f}%)")
+    print(f"{'Mode':<8} {'Size':>9} {'Conc.':>6} {'p95 change':>11} {'RPS change':>11}")
+    for result in results:
+        before = previous.get((result['mode'], result['size'], result['concurrency']))
+        if before is None:
+            continue
+        p95_change = percent_change(before['latency_ms']['p95'], result['latency_ms']['p95'])
+        rps_change = percent_change(before['throughput_rps'], result['throughput_rps'])
+        regressed = p95_change > threshold or rps_change < -threshold
+        regressions += regressed
+        print(f"{result['mode']:<8} {str(result['size']):>9} {result['concurrency']:>6} "
+              f"{p95_change:>+10.1f}% {rps_change:>+10.1f}%{'  ❌' if regressed else ''}")
+    return regressions
+
+
+def percent_change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('data_file', nargs='?', default='tomato_varieties.json')
+    parser.add_argument('--sizes', type=parse_list,
+                        help='dataset sizes in varieties (default: the file and 10x it)')
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4, 16],
+                        help='concurrent clients per level (default: 1,4,16)')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per level')
+    parser.add_argument('--warmup', type=int, default=200, help='untimed requests per target')
+    parser.add_argument('--modes', default='client,server',
+                        help='client (Flask test client) and/or server (local HTTP server)')
+    parser.add_argument('--backend', default=api.STORAGE_BACKEND, choices=sorted(BUILDERS))
+    parser.add_argument('--url', help='benchmark a running server instead (e.g. http://host:5000)')
+    parser.add_argument('--seed', type=int, default=42, help='seed for the query mix')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare with a previous --output file')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='percent change counted as a regression (default: 20)')
+    args = parser.parse_args()
+
+    print(f"⚡ API load benchmark: {args.requests} requests per level, seed {args.seed}")
+    print("=" * 72)
+    print(f"{'Mode':<8} {'Size':>9} {'Conc.':>6} {'Req/s':>10} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'p99 (ms)':>9} {'Errors':>7}")
+
+    results = []
+    loads = {}
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+        varieties = fetch_varieties(host, port)
+        paths = build_query_mix(varieties, args.requests, args.seed)
+        results += run_target('remote', lambda: HttpSender(host, port), paths,
+                              args.warmup, args.concurrency, len(varieties))
+    else:
+        if not os.path.exists(args.data_file):
+            print(f"❌ Data file not found: {args.data_file}")
+            print("Please run the scraper first: python scraper.py")
+            sys.exit(1)
+        with open(args.data_file, 'rb') as f:
+            data = serializer.loads(f.read())
+        base = len(data.get('varieties', []))
+        modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+        with tempfile.TemporaryDirectory() as workdir:
+            server = start_local_server() if 'server' in modes else None
+            try:
+                for size in args.sizes or [base, base * 10]:
+                    varieties, load_seconds = load_size(data, size, args.backend, workdir)
+                    loads[str(size)] = round(load_seconds, 3)
+                    paths = build_query_mix(varieties, args.requests, args.seed)
+                    if 'client' in modes:
+                        results += run_target('client', client_sender, paths,
+                                              args.warmup, args.concurrency, size)
+                    if server is not None:
+                        port = server.server_port
+                        results += run_target('server', lambda: HttpSender('127.0.0.1', port),
+                                              paths, args.warmup, args.concurrency, size)
+            finally:
+                if server is not None:
+                    server.shutdown()
+
+    report = {
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage_backend": None if args.url else args.backend,
+        "serializer": serializer.BACKEND,
+        "config": {"requests": args.requests, "warmup": args.warmup, "seed": args.seed,
+                   "concurrency": args.concurrency, "query_mix": dict(QUERY_MIX),
+                   "url": args.url},
+        "load_seconds": loads,
+        "results": results,
+    }
+    if args.output:
+        serializer.save_json(report, args.output)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'rb') as f:
+            regressions = compare(serializer.loads(f.read()), results, args.threshold)
+        if regressions:
+            print(f"❌ {regressions} level(s) regressed")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization of the API's largest response payloads
+Compares Flask's stdlib encoder (the previous behaviour) with serializer.py,
+which uses orjson when it is installed.
+
+Usage: python benchmark_serializer.py [tomato_varieties.json] [--copies N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import serializer
+from dataset import TomatoDataset, parse_fields, project
+from variety_store import to_plain
+
+
+def replicate(data, copies):
+    """Return the catalogue with its varieties repeated under distinct names"""
+    varieties = []
+    for copy in range(copies):
+        for variety in data.get('varieties', []):
+            suffix = f' {copy + 1}' if copy else ''
+            varieties.append({**variety, 'name': variety.get('name', '') + suffix,
+                              'slug': variety.get('slug', '') + suffix.replace(' ', '-')})
+    return {**data, 'varieties': varieties, 'total_count': len(varieties)}
+
+
+def endpoint_payloads(dataset):
+    """Build the payload each endpoint serializes, as the API does"""
+    summary = parse_fields('')
+    doc_ids = [doc_id for doc_id, _ in dataset.rank('a', 50)[0]]
+    return {
+        '/varieties': {**dataset.metadata,
+                       'varieties': [project(v, summary) for v in dataset.all_varieties()]},
+        '/varieties?fields=all': {**dataset.metadata, 'varieties': dataset.all_varieties()},
+        '/search?q=a': {'query': 'a', 'results': dataset.get_varieties(doc_ids),
+                        'total_results': len(dataset.search_ids('a'))},
+        '/variety/<name>': dataset.variety(0),
+        '/stats': dataset.stats_payload,
+    }
+
+
+def stdlib_dumps(payload):
+    """What Flask's default JSON provider produced for a response body"""
+    return json.dumps(payload, default=to_plain, ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def time_call(fn, payload, repeat):
+    """Best of `repeat` runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('data_file', nargs='?', default='tomato_varieties.json')
+    parser.add_argument('--copies', type=int, default=1,
+                        help='repeat the catalogue this many times to scale it up')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per endpoint')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_file):
+        print(f"❌ Data file not found: {args.data_file}")
+        print("Please run the scraper first: python scraper.py")
+        sys.exit(1)
+
+    with open(args.data_file, 'rb') as f:
+        data = replicate(serializer.loads(f.read()), args.copies)
+    dataset = TomatoDataset(data)
+    encode = lambda payload: serializer.dumps(payload, sort_keys=True)
+
+    print(f"⚡ Serializer benchmark: {len(dataset)} varieties, encoder: {serializer.BACKEND}")
+    print("=" * 72)
+    print(f"{'Endpoint':<24} {'Size (KB)':>10} {'stdlib (ms)':>12} {'serializer (ms)':>16} {'Speedup':>8}")
+    for endpoint, payload in endpoint_payloads(dataset).items():
+        size = len(encode(payload)) / 1024
+        before = time_call(stdlib_dumps, payload, args.repeat)
+        after = time_call(encode, payload, args.repeat)
+        print(f"{endpoint:<24} {size:>10.1f} {before:>12.3f} {after:>16.3f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
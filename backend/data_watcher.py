@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Background watcher for the tomato data file
+Polls the file's modification time and size and calls back when they change,
+so fresh scraper output is picked up without a manual /refresh
+"""
+
+import os
+import threading
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) for a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class DataWatcher:
+    """Daemon thread that calls `on_change()` whenever the watched file changes
+
+    `on_change` returns True once the new contents were loaded. A failed load
+    (for example while the scraper is still writing) is retried on the next
+    poll instead of being marked as seen. `seen` is the signature of the
+    contents already loaded, by default the file as it is now.
+    """
+
+    def __init__(self, path, on_change, interval=2.0, seen=None):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.seen = seen if seen is not None else file_signature(path)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='data-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def poll(self):
+        """Check the file once; returns True if a change was loaded"""
+        signature = file_signature(self.path)
+        if signature is None or signature == self.seen:
+            return False
+        if self.on_change():
+            self.seen = signature
+            return True
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"❌ Data watcher error: {e}")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Tomato dataset snapshot
+Bundles the loaded JSON data with every structure derived from it so the API
+can publish a fully built snapshot with a single reference swap
+"""
+
+import base64
+import hashlib
+import json
+from bisect import bisect_right
+from collections import Counter
+
+from facet_index import FacetIndex
+from fuzzy_index import FuzzyIndex
+from range_index import RangeIndex
+from response_cache import ResponseCache
+from search_index import SearchIndex
+from stats import CatalogueStats
+from suggest_index import SuggestIndex
+from variety_store import VarietyRecord, to_plain
+
+# Fields returned by list endpoints unless the client asks for others;
+# leaves out the heavy raw_text, images and page_title
+SUMMARY_FIELDS = ('name', 'slug', 'url', 'description', 'characteristics', 'growing_info')
+
+
+def lookup_key(value):
+    """Normalize a variety name or slug for case-insensitive lookups"""
+    return (value or '').casefold()
+
+
+def data_version(raw):
+    """Derive a short, stable version tag from the raw bytes of the data file"""
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def sort_key(variety):
+    """Ordering key for paginated listings, independent of catalogue position"""
+    return (lookup_key(variety.get('slug') or variety.get('name')), variety.get('name') or '')
+
+
+def content_digest(variety):
+    """Short digest of a variety's full content"""
+    raw = json.dumps(variety, sort_keys=True, ensure_ascii=False, default=to_plain)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def sort_keys(varieties):
+    """Return a unique pagination key for each variety, in catalogue order
+
+    The key is sort_key() plus a tiebreaker: empty for most varieties, and
+    the content digest for varieties that share a sort_key(), so a page
+    boundary between them neither skips nor repeats one. Copies that are
+    identical in every field are numbered after their digest.
+    """
+    keys = [sort_key(variety) for variety in varieties]
+    shared = {key for key, count in Counter(keys).items() if count > 1}
+    copies = Counter()
+    unique = []
+    for key, variety in zip(keys, varieties):
+        tiebreak = ''
+        if key in shared:
+            digest = content_digest(variety)
+            copy = copies[key, digest]
+            copies[key, digest] += 1
+            tiebreak = f'{digest}-{copy}' if copy else digest
+        unique.append(key + (tiebreak,))
+    return unique
+
+
+def parse_fields(value):
+    """Parse a ?fields= parameter into a field tuple, or None for full records"""
+    if not value:
+        return SUMMARY_FIELDS
+    if value in ('all', '*'):
+        return None
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    return fields or SUMMARY_FIELDS
+
+
+def project(variety, fields):
+    """Return only the requested top-level fields of a variety"""
+    if fields is None:
+        return variety
+    return {field: variety[field] for field in fields if field in variety}
+
+
+def encode_cursor(key):
+    """Encode a sort key as an opaque pagination cursor"""
+    raw = json.dumps(list(key), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor back into a sort key; raises ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not (isinstance(key, list) and len(key) == 3 and all(isinstance(k, str) for k in key)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return tuple(key)
+
+
+class NameIndex:
+    """Case-folded hash index from variety name and slug to catalogue position
+
+    Names and slugs share one key space. When several varieties claim the same
+    key the first one in catalogue order wins, matching the old linear scan,
+    and every claimant is recorded in `duplicates` for diagnostics.
+    """
+
+    def __init__(self, varieties):
+        self.positions = {}
+        self.duplicates = {}
+
+        for doc_id, variety in enumerate(varieties):
+            keys = {lookup_key(variety.get('name')), lookup_key(variety.get('slug'))}
+            keys.discard('')
+            for key in keys:
+                first = self.positions.setdefault(key, doc_id)
+                if first != doc_id:
+                    self.duplicates.setdefault(key, [first]).append(doc_id)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get(self, name):
+        """Return the catalogue position for a name or slug, or None"""
+        return self.positions.get(lookup_key(name))
+
+
+class TomatoDataset:
+    """Immutable snapshot of the catalogue and its indexes
+
+    This is the in-memory storage backend. Every backend exposes the same
+    read interface to the API: version, response_cache, metadata, len(),
+    all_varieties(), lookup()/variety(), get_varieties(), page(), search_ids()/search(), rank(),
+    stats_payload, facet_index, range_index, fuzzy_index and suggest_index.
+
+    Passing the snapshot being replaced as `previous` lets the statistics
+    carry over by delta instead of being recounted from scratch. `version`
+    identifies the data for ETags; it is derived from the data if omitted.
+    """
+
+    def __init__(self, data, previous=None, version=None):
+        self.version = version or data_version(
+            json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        # Serialized response bodies for this version, keyed by endpoint/args
+        self.response_cache = ResponseCache()
+        # Compact records replace the parsed dicts so those can be freed
+        self.varieties = [VarietyRecord(v) for v in data.get('varieties', [])]
+        self.data = {**data, 'varieties': self.varieties}
+        self.metadata = {
+            "total_count": data.get('total_count', 0),
+            "scraped_at": data.get('scraped_at', ''),
+            "source": data.get('source', '')
+        }
+        self.search_index = SearchIndex(self.varieties)
+        self.name_index = NameIndex(self.varieties)
+        self.facet_index = FacetIndex.from_varieties(self.varieties)
+        self.range_index = RangeIndex.from_varieties(self.varieties)
+        self.fuzzy_index = FuzzyIndex.from_varieties(self.varieties)
+        self.suggest_index = SuggestIndex.from_varieties(self.varieties, self.facet_index)
+
+        # Sorted keys for cursor pagination; a cursor names the last key a
+        # client saw, so pages stay consistent across refreshes
+        ordered = sorted(zip(sort_keys(self.varieties), range(len(self.varieties))))
+        self.ordered_keys = [key for key, _ in ordered]
+        self.ordered_ids = [doc_id for _, doc_id in ordered]
+
+        if isinstance(previous, TomatoDataset):
+            self.stats = previous.stats.copy()
+            self.stats.apply_changes(previous.varieties, self.varieties)
+        else:
+            self.stats = CatalogueStats(self.varieties)
+        self.stats_payload = {
+            **self.stats.to_dict(),
+            "scraped_at": data.get('scraped_at', ''),
+            "source": data.get('source', '')
+        }
+
+        if self.name_index.duplicates:
+            print(f"⚠️  {len(self.name_index.duplicates)} variety names/slugs are shared "
+                  f"by more than one variety; the first match wins")
+
+    def __len__(self):
+        return len(self.varieties)
+
+    def all_varieties(self):
+        """Return every variety in catalogue order"""
+        return self.varieties
+
+    def lookup(self, name):
+        """Return the id of the variety whose name or slug matches, or None"""
+        return self.name_index.get(name)
+
+    def variety(self, doc_id):
+        """Return the variety with the given id"""
+        return self.varieties[doc_id]
+
+    def get_varieties(self, doc_ids):
+        """Return the varieties with the given ids, in the same order"""
+        return [self.varieties[doc_id] for doc_id in doc_ids]
+
+    def find_variety(self, name):
+        """Return the variety whose name or slug matches, or None"""
+        doc_id = self.lookup(name)
+        if doc_id is None:
+            return None
+        return self.varieties[doc_id]
+
+    def page(self, limit, after=None):
+        """Return up to `limit` varieties in sort-key order after a key
+
+        Returns the varieties and the key of the last one when more remain.
+        """
+        start = bisect_right(self.ordered_keys, after) if after is not None else 0
+        end = min(start + limit, len(self.ordered_ids))
+        varieties = [self.varieties[doc_id] for doc_id in self.ordered_ids[start:end]]
+        next_key = self.ordered_keys[end - 1] if end < len(self.ordered_ids) else None
+        return varieties, next_key
+
+    def search_ids(self, query):
+        """Return the ids of varieties whose searchable text contains the query"""
+        return self.search_index.search(query)
+
+    def rank(self, query, k):
+        """Return ([(id, score)] for the k most relevant matches, total matches)"""
+        return self.search_index.rank(query, k)
+
+    def search(self, query):
+        """Return the varieties whose searchable text contains the query"""
+        return self.get_varieties(self.search_ids(query))
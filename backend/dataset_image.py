@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary image of the tomato catalogue
+The records and the tables behind lookups, pagination, search and filters are
+laid out in one read-only file that every API worker maps instead of parsing
+JSON into private objects: the OS loads pages lazily and shares them between
+processes, and a refresh is a new file swapped in atomically and remapped by
+each worker
+
+Build the image with: python dataset_image.py [tomato_varieties.json] [tomato_varieties.img]
+"""
+
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import ChainMap
+from collections.abc import Mapping
+
+import serializer
+from dataset import data_version, lookup_key, sort_keys
+from facet_index import FacetIndex
+from fuzzy_index import FuzzyIndex
+from range_index import RANGE_FIELDS, NumericRange, RangeIndex
+from response_cache import ResponseCache
+from search_index import FIELD_WEIGHTS, SearchIndex
+from stats import CatalogueStats
+from suggest_index import SuggestIndex
+
+MAGIC = b'TOMIMG04'
+HEADER_SIZE = 16  # magic, then the header length as a little-endian u64
+OFFSET_TYPE = 'Q'  # byte offsets into a blob
+ID_TYPE = 'I'      # doc ids and counts
+
+
+def pack_strings(values):
+    """Concatenate byte strings into (offsets array with a final end offset, blob)"""
+    offsets = array(OFFSET_TYPE, [0])
+    blob = bytearray()
+    for value in values:
+        blob += value
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def pack_arrays(arrays, typecode=ID_TYPE):
+    """Concatenate arrays into (offsets array with a final end offset, values array)"""
+    offsets = array(OFFSET_TYPE, [0])
+    values = array(typecode)
+    for value in arrays:
+        values.extend(value)
+        offsets.append(len(values))
+    return offsets, values
+
+
+class StringTable:
+    """Read-only sequence of byte strings over an offsets array and a blob
+
+    Decoded with `decode` on access, so it can be searched with bisect
+    without building a list of every entry.
+    """
+
+    def __init__(self, offsets, blob, decode=bytes):
+        self.offsets = offsets
+        self.blob = blob
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.decode(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+
+class PostingTable(Mapping):
+    """Read-only {key: posting} over sorted keys and column arrays
+
+    A key's posting is the slice between its offsets of each column: one
+    array of ids, or a tuple of parallel arrays when there are several.
+    """
+
+    def __init__(self, keys, offsets, *columns):
+        self.keys = keys
+        self.offsets = offsets
+        self.columns = columns
+
+    def __getitem__(self, key):
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            raise KeyError(key)
+        start, end = self.offsets[position], self.offsets[position + 1]
+        if len(self.columns) == 1:
+            return self.columns[0][start:end]
+        return tuple(column[start:end] for column in self.columns)
+
+    def __iter__(self):
+        return (self.keys[position] for position in range(len(self.keys)))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class BitmapTable(Mapping):
+    """Read-only {key: bitmap} over sorted keys and fixed-size little-endian bitmaps"""
+
+    def __init__(self, keys, blob, size):
+        self.keys = keys
+        self.blob = blob
+        self.width = (size + 7) // 8
+
+    def __getitem__(self, key):
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            raise KeyError(key)
+        return int.from_bytes(self.blob[position * self.width:(position + 1) * self.width],
+                              'little')
+
+    def __iter__(self):
+        return (self.keys[position] for position in range(len(self.keys)))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def decode_text(raw):
+    return bytes(raw).decode('utf-8')
+
+
+def decode_record(raw):
+    return serializer.loads(bytes(raw))
+
+
+def decode_tuple(raw):
+    return tuple(serializer.loads(bytes(raw)))
+
+
+def build_image(json_path, image_path):
+    """Convert the scraper's JSON file into a dataset image
+
+    The image is written next to its destination and moved into place
+    atomically, so a worker never maps a half-written file.
+    """
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    data = serializer.loads(raw)
+    varieties = data.get('varieties', [])
+
+    sections = {}
+    bitmap_width = (len(varieties) + 7) // 8
+
+    # Records, each stored as its own JSON document
+    sections['record_offsets'], sections['records'] = pack_strings(
+        serializer.dumps(variety) for variety in varieties)
+
+    # The search index's tables, so queries run SearchIndex's own code over
+    # the mapping: the search text, n-gram postings (id arrays, or bitmaps
+    # for common grams) and per-field token postings with term counts
+    index = SearchIndex(varieties)
+    sections['text_offsets'], sections['texts'] = index.offsets, index.text
+    sparse = sorted(gram for gram, posting in index.grams.items() if not isinstance(posting, int))
+    dense = sorted(gram for gram, posting in index.grams.items() if isinstance(posting, int))
+    sections['gram_key_offsets'], sections['gram_keys'] = pack_strings(
+        gram.encode('utf-8') for gram in sparse)
+    sections['gram_offsets'], sections['gram_ids'] = pack_arrays(index.grams[gram] for gram in sparse)
+    sections['bitmap_gram_offsets'], sections['bitmap_grams'] = pack_strings(
+        gram.encode('utf-8') for gram in dense)
+    sections['gram_bitmaps'] = b''.join(index.grams[gram].to_bytes(bitmap_width, 'little')
+                                        for gram in dense)
+    for field in FIELD_WEIGHTS:
+        tokens = sorted(index.tokens[field])
+        postings = [index.tokens[field][token] for token in tokens]
+        sections[f'{field}_token_offsets'], sections[f'{field}_tokens'] = pack_strings(
+            token.encode('utf-8') for token in tokens)
+        sections[f'{field}_offsets'], sections[f'{field}_ids'] = pack_arrays(
+            ids for ids, _ in postings)
+        sections[f'{field}_counts'] = pack_arrays(counts for _, counts in postings)[1]
+        sections[f'{field}_lengths'] = index.lengths[field]
+
+    # Facet bitmaps per value, sorted by value; the case-folded spellings go
+    # in the header
+    facet_index = FacetIndex.from_varieties(varieties)
+    for field, bitmaps in facet_index.bitmaps.items():
+        values = sorted(bitmaps)
+        sections[f'facet_{field}_value_offsets'], sections[f'facet_{field}_values'] = pack_strings(
+            value.encode('utf-8') for value in values)
+        sections[f'facet_{field}_bitmaps'] = b''.join(bitmaps[value].to_bytes(bitmap_width, 'little')
+                                                      for value in values)
+
+    # Parsed measurement bounds, sorted, with their doc ids
+    range_index = RangeIndex.from_varieties(varieties)
+    for field, numeric_range in range_index.fields.items():
+        sections[f'range_{field}_lows'] = array('d', numeric_range.lows)
+        sections[f'range_{field}_low_ids'] = array(ID_TYPE, numeric_range.low_ids)
+        sections[f'range_{field}_highs'] = array('d', numeric_range.highs)
+        sections[f'range_{field}_high_ids'] = array(ID_TYPE, numeric_range.high_ids)
+
+    # Fuzzy terms by term id, and their trigram postings
+    fuzzy_index = FuzzyIndex.from_varieties(varieties)
+    sections['fuzzy_term_offsets'], sections['fuzzy_terms'] = pack_strings(
+        term.encode('utf-8') for term in fuzzy_index.terms)
+    sections['fuzzy_term_docs'] = array(ID_TYPE, fuzzy_index.term_docs)
+    fuzzy_grams = sorted(fuzzy_index.postings)
+    sections['fuzzy_gram_key_offsets'], sections['fuzzy_gram_keys'] = pack_strings(
+        gram.encode('utf-8') for gram in fuzzy_grams)
+    sections['fuzzy_gram_offsets'], sections['fuzzy_gram_ids'] = pack_arrays(
+        fuzzy_index.postings[gram] for gram in fuzzy_grams)
+
+    # Completion keys and their suggestions, tier by tier
+    suggest_index = SuggestIndex.from_varieties(varieties, facet_index)
+    for tier, (keys, items) in enumerate(suggest_index.tiers):
+        sections[f'suggest_{tier}_key_offsets'], sections[f'suggest_{tier}_keys'] = pack_strings(
+            key.encode('utf-8') for key in keys)
+        sections[f'suggest_{tier}_item_offsets'], sections[f'suggest_{tier}_items'] = pack_strings(
+            serializer.dumps(list(item)) for item in items)
+
+    # Case-folded names and slugs; the first variety in catalogue order wins
+    positions = {}
+    for doc_id, variety in enumerate(varieties):
+        for key in (lookup_key(variety.get('name')), lookup_key(variety.get('slug'))):
+            if key:
+                positions.setdefault(key, doc_id)
+    names = sorted(positions)
+    sections['name_offsets'], sections['names'] = pack_strings(name.encode('utf-8') for name in names)
+    sections['name_ids'] = array(ID_TYPE, (positions[name] for name in names))
+
+    # Sort keys for cursor pagination, in sorted order with their doc ids
+    ordered = sorted(zip(sort_keys(varieties), range(len(varieties))))
+    sections['sort_key_offsets'], sections['sort_keys'] = pack_strings(
+        serializer.dumps(list(key)) for key, _ in ordered)
+    sections['sorted_ids'] = array(ID_TYPE, (doc_id for _, doc_id in ordered))
+
+    header = {
+        'version': data_version(raw),
+        'byteorder': sys.byteorder,
+        'metadata': {
+            "total_count": data.get('total_count', 0),
+            "scraped_at": data.get('scraped_at', ''),
+            "source": data.get('source', '')
+        },
+        'stats': CatalogueStats(varieties).to_dict(),
+        'variety_count': len(varieties),
+        'facet_values': facet_index.value_keys,
+        'suggest_tiers': len(suggest_index.tiers),
+        'sections': {}
+    }
+
+    # Sections follow the header, each aligned to 8 bytes
+    layout = []
+    position = 0
+    for name, section in sections.items():
+        content = section.tobytes() if isinstance(section, array) else section
+        typecode = section.typecode if isinstance(section, array) else None
+        header['sections'][name] = (position, len(content), typecode)
+        layout.append(content)
+        position += len(content) + (-len(content) % 8)
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+
+    tmp_path = image_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for content in layout:
+            f.write(content)
+            f.write(b'\0' * (-len(content) % 8))
+    os.replace(tmp_path, image_path)
+    return len(varieties)
+
+
+def read_header(f):
+    """Read and validate the JSON header of an open image file"""
+    prefix = f.read(HEADER_SIZE)
+    if len(prefix) != HEADER_SIZE or prefix[:8] != MAGIC:
+        raise ValueError(f"{f.name} is not a tomato dataset image")
+    length = int.from_bytes(prefix[8:], 'little')
+    header = json.loads(f.read(length))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError(f"{f.name} was built on a {header['byteorder']}-endian machine")
+    return header, HEADER_SIZE + length
+
+
+def image_version(path):
+    """Return the data version of an image without mapping it"""
+    with open(path, 'rb') as f:
+        return read_header(f)[0]['version']
+
+
+class ImageDataset:
+    """Snapshot backed by a memory-mapped image, with the TomatoDataset read interface
+
+    Records and every index table are read straight from the mapping, so
+    opening an image decodes nothing but its header.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header, start = read_header(f)
+            # The mapping stays valid after the file is closed or replaced
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._map)
+        sections = {}
+        for name, (offset, length, typecode) in header['sections'].items():
+            section = view[start + offset:start + offset + length]
+            sections[name] = section.cast(typecode) if typecode else section
+
+        self.version = header['version']
+        self.metadata = header['metadata']
+        self.variety_count = header['variety_count']
+        self.stats_payload = {
+            **header['stats'],
+            "scraped_at": self.metadata['scraped_at'],
+            "source": self.metadata['source']
+        }
+        # Serialized response bodies for this version, keyed by endpoint/args
+        self.response_cache = ResponseCache()
+
+        self._records = StringTable(sections['record_offsets'], sections['records'], decode_record)
+        self._names = StringTable(sections['name_offsets'], sections['names'], decode_text)
+        self._name_ids = sections['name_ids']
+        self._sort_keys = StringTable(sections['sort_key_offsets'], sections['sort_keys'],
+                                      decode_tuple)
+        self._sorted_ids = sections['sorted_ids']
+
+        grams = ChainMap(
+            PostingTable(StringTable(sections['gram_key_offsets'], sections['gram_keys'],
+                                     decode_text),
+                         sections['gram_offsets'], sections['gram_ids']),
+            BitmapTable(StringTable(sections['bitmap_gram_offsets'], sections['bitmap_grams'],
+                                    decode_text),
+                        sections['gram_bitmaps'], self.variety_count))
+        tokens = {field: PostingTable(StringTable(sections[f'{field}_token_offsets'],
+                                                  sections[f'{field}_tokens'], decode_text),
+                                      sections[f'{field}_offsets'], sections[f'{field}_ids'],
+                                      sections[f'{field}_counts'])
+                  for field in FIELD_WEIGHTS}
+        lengths = {field: sections[f'{field}_lengths'] for field in FIELD_WEIGHTS}
+        # find() runs on the mapping itself, where the texts start at text_base
+        self.search_index = SearchIndex.from_tables(
+            self.variety_count, grams, tokens, lengths, self._map, sections['text_offsets'],
+            text_base=start + header['sections']['texts'][0])
+
+        facet_bitmaps = {
+            field: BitmapTable(StringTable(sections[f'facet_{field}_value_offsets'],
+                                           sections[f'facet_{field}_values'], decode_text),
+                               sections[f'facet_{field}_bitmaps'], self.variety_count)
+            for field in header['facet_values']}
+        self.facet_index = FacetIndex.from_tables(self.variety_count, header['facet_values'],
+                                                  facet_bitmaps)
+        self.range_index = RangeIndex.from_tables(self.variety_count, {
+            field: NumericRange.from_tables(sections[f'range_{field}_lows'],
+                                            sections[f'range_{field}_low_ids'],
+                                            sections[f'range_{field}_highs'],
+                                            sections[f'range_{field}_high_ids'])
+            for field in RANGE_FIELDS})
+        self.fuzzy_index = FuzzyIndex.from_tables(
+            StringTable(sections['fuzzy_term_offsets'], sections['fuzzy_terms'], decode_text),
+            sections['fuzzy_term_docs'],
+            PostingTable(StringTable(sections['fuzzy_gram_key_offsets'],
+                                     sections['fuzzy_gram_keys'], decode_text),
+                         sections['fuzzy_gram_offsets'], sections['fuzzy_gram_ids']))
+        self.suggest_index = SuggestIndex.from_tables([
+            (StringTable(sections[f'suggest_{tier}_key_offsets'], sections[f'suggest_{tier}_keys'],
+                         decode_text),
+             StringTable(sections[f'suggest_{tier}_item_offsets'],
+                         sections[f'suggest_{tier}_items'], decode_tuple))
+            for tier in range(header['suggest_tiers'])])
+
+    def __len__(self):
+        return self.variety_count
+
+    def all_varieties(self):
+        """Return every variety in catalogue order"""
+        return [self._records[doc_id] for doc_id in range(self.variety_count)]
+
+    def lookup(self, name):
+        """Return the id of the variety whose name or slug matches, or None"""
+        key = lookup_key(name)
+        position = bisect_left(self._names, key)
+        if position < len(self._names) and self._names[position] == key:
+            return self._name_ids[position]
+        return None
+
+    def variety(self, doc_id):
+        """Return the variety with the given id"""
+        return self._records[doc_id]
+
+    def get_varieties(self, doc_ids):
+        """Return the varieties with the given ids, in the same order"""
+        return [self._records[doc_id] for doc_id in doc_ids]
+
+    def find_variety(self, name):
+        """Return the variety whose name or slug matches, or None"""
+        doc_id = self.lookup(name)
+        if doc_id is None:
+            return None
+        return self.variety(doc_id)
+
+    def page(self, limit, after=None):
+        """Return up to `limit` varieties in sort-key order after a key"""
+        start = bisect_right(self._sort_keys, after) if after is not None else 0
+        end = min(start + limit, self.variety_count)
+        varieties = self.get_varieties(self._sorted_ids[start:end])
+        next_key = self._sort_keys[end - 1] if end < self.variety_count else None
+        return varieties, next_key
+
+    def search_ids(self, query):
+        """Return the ids of varieties whose searchable text contains the query"""
+        return self.search_index.search(query)
+
+    def rank(self, query, k):
+        """Return ([(id, score)] for the k most relevant matches, total matches)"""
+        return self.search_index.rank(query, k)
+
+    def search(self, query):
+        """Return the varieties whose searchable text contains the query"""
+        return self.get_varieties(self.search_ids(query))
+
+
+if __name__ == '__main__':
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'tomato_varieties.json'
+    image_path = sys.argv[2] if len(sys.argv) > 2 else 'tomato_varieties.img'
+
+    print(f"🗺️  Building {image_path} from {json_path}...")
+    count = build_image(json_path, image_path)
+    print(f"✅ Stored {count} varieties in {image_path}")
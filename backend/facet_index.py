@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Bitmap facet index for tomato variety characteristics
+Keeps one bitmap (a Python int, bit i = variety i) per (field, value) pair so
+multi-facet filters and their counts are bitwise AND and popcount operations
+"""
+
+from itertools import islice
+
+# Characteristics offered as facets on /varieties/filter
+FACET_FIELDS = ('tomato_type', 'breed', 'origin', 'season', 'leaf_type', 'plant_type',
+                'fruit_shape', 'skin_color', 'flesh_color')
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    # Python < 3.10
+    def popcount(bits):
+        """Number of set bits in a bitmap"""
+        return bin(bits).count('1')
+
+
+def ids_bitmap(ids, size):
+    """Build a bitmap from doc ids in one pass instead of one big-int OR per id"""
+    buffer = bytearray((size + 7) // 8)
+    for doc_id in ids:
+        buffer[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bitmap_ids(bits):
+    """Yield the positions of the set bits in ascending order"""
+    digits = bin(bits)[:1:-1]  # least significant bit first
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def bitmap_ids(bits, limit=None):
+    """Return the positions of the set bits in ascending order"""
+    return list(islice(iter_bitmap_ids(bits), limit))
+
+
+class FacetIndex:
+    """Bitmaps per facet value, built from (doc_id, field, value) entries
+
+    Values keep their original spelling for display; queries match them
+    case-insensitively.
+    """
+
+    def __init__(self, entries, size, fields=FACET_FIELDS):
+        self.size = size
+        self.all_bits = (1 << size) - 1
+        self.value_keys = {field: {} for field in fields}
+
+        postings = {field: {} for field in fields}
+        for doc_id, field, value in entries:
+            if field not in postings or not isinstance(value, str) or not value.strip():
+                continue
+            value = value.strip()
+            value = self.value_keys[field].setdefault(value.casefold(), value)
+            postings[field].setdefault(value, []).append(doc_id)
+
+        self.bitmaps = {field: {value: ids_bitmap(ids, size) for value, ids in values.items()}
+                        for field, values in postings.items()}
+
+    @classmethod
+    def from_varieties(cls, varieties, fields=FACET_FIELDS):
+        """Build the index from variety characteristics"""
+        entries = ((doc_id, field, value)
+                   for doc_id, variety in enumerate(varieties)
+                   for field, value in variety.get('characteristics', {}).items())
+        return cls(entries, len(varieties), fields)
+
+    @classmethod
+    def from_tables(cls, size, value_keys, bitmaps):
+        """Wrap prebuilt tables, such as those mapped from a dataset image
+
+        Each `bitmaps[field]` only needs item access and items().
+        """
+        index = cls.__new__(cls)
+        index.size = size
+        index.all_bits = (1 << size) - 1
+        index.value_keys = value_keys
+        index.bitmaps = bitmaps
+        return index
+
+    def field_bits(self, field, values):
+        """OR together the bitmaps of the requested values of one field"""
+        bits = 0
+        for value in values:
+            canonical = self.value_keys[field].get(value.strip().casefold())
+            if canonical is not None:
+                bits |= self.bitmaps[field][canonical]
+        return bits
+
+    def filter(self, predicates, restrict=None):
+        """Apply facet predicates and count the options left in every facet
+
+        `predicates` maps a field to the values accepted for it: values of one
+        field are ORed, fields are ANDed. `restrict` is an optional bitmap from
+        other filters that everything is limited to. Each facet's counts ignore
+        that facet's own predicate, so they show what selecting an option would
+        give. Returns (matching bitmap, {field: {value: count}}).
+        """
+        masks = {field: self.field_bits(field, values) for field, values in predicates.items()}
+        scope = self.all_bits if restrict is None else restrict
+
+        matches = scope
+        for bits in masks.values():
+            matches &= bits
+
+        facets = {}
+        for field, bitmaps in self.bitmaps.items():
+            base = scope
+            for other, bits in masks.items():
+                if other != field:
+                    base &= bits
+            counts = {}
+            for value, bits in bitmaps.items():
+                count = popcount(bits & base)
+                if count:
+                    counts[value] = count
+            facets[field] = dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+        return matches, facets
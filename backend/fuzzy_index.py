@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Typo-tolerant name matching for /search?fuzzy=1
+A trigram index over variety names and slugs generates a short candidate list,
+and a bounded edit distance verifies it, so misspellings like "Brandywyne" or
+"Cherokee Purpel" resolve without comparing the query against every name
+"""
+
+import re
+import time
+
+NON_ALNUM = re.compile(r'[\W_]+')
+# Candidates verified per query, best trigram overlap first
+MAX_CANDIDATES = 64
+# Trigrams shared by more terms than this are skipped during candidate generation
+MAX_POSTING_LENGTH = 2000
+# Shortest name word matched on its own ("purpel" -> "Cherokee Purple")
+MIN_WORD_LENGTH = 4
+
+
+def normalize(text):
+    """Case-fold and collapse punctuation so "Sun-Gold" and "sun gold" agree"""
+    return NON_ALNUM.sub(' ', (text or '').casefold()).strip()
+
+
+def trigrams(text):
+    """Trigrams of a normalized string, padded so short words still have some"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(query):
+    """Edit distance tolerated for a query of this length"""
+    if len(query) <= 4:
+        return 1
+    if len(query) <= 8:
+        return 2
+    return 3
+
+
+def bounded_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or None if above limit
+
+    Adjacent transpositions count as one edit, so "purpel" is one edit from
+    "purple". Rows stop early once every cell exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return None
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class FuzzyIndex:
+    """Trigram postings over the names, slugs and name words of each variety"""
+
+    def __init__(self, entries):
+        self.terms = []      # normalized strings that can be matched
+        self.term_docs = []  # doc id each term belongs to
+        self.postings = {}
+
+        for doc_id, name, slug in entries:
+            name = normalize(name)
+            terms = {name, normalize(slug)}
+            terms.update(word for word in name.split() if len(word) >= MIN_WORD_LENGTH)
+            terms.discard('')
+            for term in terms:
+                term_id = len(self.terms)
+                self.terms.append(term)
+                self.term_docs.append(doc_id)
+                for gram in trigrams(term):
+                    self.postings.setdefault(gram, []).append(term_id)
+
+    @classmethod
+    def from_varieties(cls, varieties):
+        return cls((doc_id, v.get('name'), v.get('slug')) for doc_id, v in enumerate(varieties))
+
+    @classmethod
+    def from_tables(cls, terms, term_docs, postings):
+        """Wrap prebuilt tables, such as those mapped from a dataset image
+
+        `terms` and `term_docs` are indexed by term id; `postings` only needs get().
+        """
+        index = cls.__new__(cls)
+        index.terms = terms
+        index.term_docs = term_docs
+        index.postings = postings
+        return index
+
+    def search(self, query, budget_ms=5.0, limit=20):
+        """Return ([(doc_id, distance)], truncated) for names close to the query
+
+        Matches are ordered by distance, then catalogue order. Verification
+        stops when the time budget runs out, in which case `truncated` is True.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        query = normalize(query)
+        if not query:
+            return [], False
+
+        # Very common trigrams cost the most and discriminate the least; when
+        # enough rarer ones remain, count only those
+        query_grams = sorted(trigrams(query), key=lambda gram: len(self.postings.get(gram, ())))
+        rare = [gram for gram in query_grams
+                if len(self.postings.get(gram, ())) <= MAX_POSTING_LENGTH]
+        used_grams = rare if len(rare) >= len(query_grams) // 2 + 1 else query_grams
+
+        shared = {}
+        for gram in used_grams:
+            for term_id in self.postings.get(gram, ()):
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        # One edit (a transposition included) changes at most four padded trigrams
+        limit_distance = max_distance(query)
+        threshold = max(1, len(used_grams) - 4 * limit_distance)
+        candidates = sorted((term_id for term_id, count in shared.items() if count >= threshold),
+                            key=lambda term_id: -shared[term_id])[:MAX_CANDIDATES]
+
+        best = {}
+        truncated = False
+        for term_id in candidates:
+            if time.perf_counter() > deadline:
+                truncated = True
+                break
+            distance = bounded_distance(query, self.terms[term_id], limit_distance)
+            if distance is not None:
+                doc_id = self.term_docs[term_id]
+                if distance < best.get(doc_id, limit_distance + 1):
+                    best[doc_id] = distance
+
+        matches = sorted(best.items(), key=lambda item: (item[1], item[0]))
+        return matches[:limit], truncated
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Synthetic catalogue generator for scale testing
+Writes tomato_varieties.json-compatible files (the scraper's varieties,
+characteristics, growing_info, images and raw_text shape) with any number
+of varieties. Records are generated and written one at a time, so 1M
+varieties need no more memory than ten.
+
+Usage: python generate_catalogue.py 10k 100k 1M [--seed N] [--output FILE]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import serializer
+
+SOURCE = "https://njaes.rutgers.edu/tomato-varieties/"
+
+# Name parts: every prefix/core pair is used once, then once with each
+# qualifier, before numbered repeats begin
+NAME_PREFIXES = (
+    "Cherokee", "Brandywine", "Aunt Ruby's", "German", "Black", "Green", "Mortgage", "Amish",
+    "Hillbilly", "Kellogg's", "Mr. Stripey", "Big", "Early", "Sweet", "Golden", "Pink", "Purple",
+    "Yellow", "Mountain", "Old", "Grandma's", "Russian", "Italian", "Japanese", "Polish",
+    "Siberian", "Carbon", "Mexico", "Prairie", "Lucky", "Rainbow", "Missouri", "Ozark",
+    "Tennessee", "Virginia", "Sunny", "Silver", "Copper", "Blue", "Wild", "Dwarf", "Giant",
+    "Crimson", "Ruby", "Velvet", "Midnight", "Striped", "Royal", "Chocolate", "Orange",
+    "Marvel", "Gardener's", "Pineapple", "Hawaiian", "Arkansas", "Delicious", "Country", "Paul",
+    "Anna", "Ivan",
+)
+NAME_CORES = (
+    "Beefsteak", "Cherry", "Plum", "Paste", "Pear", "Globe", "Gold", "Queen", "Goliath", "Delight",
+    "Heart", "Zebra", "Krim", "Prince", "Wonder", "Belle", "Boy", "Girl", "Lifter", "Sugar",
+    "Pride", "Star", "Sun", "Moon", "Jewel", "Bomb", "Ox Heart", "Roma", "Berry", "Drop",
+    "Grape", "Currant", "Ponderosa", "Rose", "Stuffer", "Amana", "Stripe", "Cream", "Sausage",
+    "Gem", "Glory", "Beauty", "Blush", "Fire", "Dream", "Monster", "Supreme", "Treasure",
+    "Surprise", "Special",
+)
+NAME_QUALIFIERS = ("Improved", "VF", "Hybrid", "F1", "Select", "Strain", "Heirloom", "Dwarf",
+                   "Early", "Large", "Potato Leaf", "Red", "Yellow", "Pink", "Bicolor")
+
+# field -> (share of varieties that have it, {value: relative frequency})
+CATEGORICAL = {
+    'tomato_type': (0.95, {"Heirloom": 35, "Hybrid": 20, "Cherry": 15, "Paste": 10,
+                           "Beefsteak": 10, "Grape": 5, "Pear": 3, "Currant": 2}),
+    'breed': (0.85, {"Open Pollinated": 60, "Hybrid": 35, "Dwarf Tomato Project": 5}),
+    'origin': (0.70, {"USA": 40, "Russia": 12, "Italy": 8, "Germany": 6, "Ukraine": 5,
+                      "Canada": 5, "Mexico": 4, "France": 4, "Poland": 4, "Japan": 3,
+                      "Australia": 3, "Unknown": 6}),
+    'season': (0.90, {"Mid": 45, "Early": 25, "Late": 20, "Early-Mid": 5, "Mid-Late": 5}),
+    'leaf_type': (0.75, {"Regular Leaf": 75, "Potato Leaf": 20, "Rugose": 5}),
+    'plant_type': (0.90, {"Indeterminate": 65, "Determinate": 25, "Semi-determinate": 8,
+                          "Dwarf": 2}),
+    'fruit_shape': (0.80, {"Round": 30, "Oblate": 25, "Globe": 15, "Heart": 8, "Plum": 8,
+                           "Pear": 4, "Elongated": 5, "Ribbed": 5}),
+    'skin_color': (0.85, {"Red": 40, "Pink": 15, "Yellow": 10, "Orange": 8, "Purple": 8,
+                          "Black": 5, "Green": 5, "Bi-color": 6, "White": 3}),
+    'flesh_color': (0.80, {"Red": 42, "Pink": 15, "Yellow": 10, "Orange": 8, "Purple": 7,
+                           "Black": 5, "Green": 5, "Bi-color": 5, "White": 3}),
+    'taste': (0.60, {"Sweet": 25, "Rich": 15, "Tangy": 12, "Mild": 12, "Complex": 10,
+                     "Balanced": 10, "Smoky": 6, "Acidic": 5, "Sweet and tangy": 5}),
+    'crack_resistance': (0.30, {"Good": 50, "Fair": 35, "Poor": 15}),
+}
+DISEASES = ("V", "F", "F2", "N", "T", "A", "St", "LB", "TSWV")
+# Typical fruit weight in ounces per tomato type: (low, high)
+FRUIT_OUNCES = {"Cherry": (0.3, 1), "Grape": (0.2, 0.6), "Currant": (0.05, 0.2),
+                "Pear": (0.5, 1.5), "Paste": (3, 8), "Beefsteak": (12, 32),
+                "Heirloom": (6, 24), "Hybrid": (4, 12)}
+# Days to maturity by season: (low, high)
+SEASON_DAYS = {"Early": (50, 65), "Early-Mid": (62, 72), "Mid": (68, 82),
+               "Mid-Late": (78, 88), "Late": (85, 105)}
+# Characteristics copied into growing_info, as the scraper does
+CHAR_TO_GROWING = {'plant_type': 'plant_type', 'plant_height': 'plant_height',
+                   'fruit_size': 'fruit_size', 'fruit_shape': 'fruit_shape',
+                   'days_to_maturity': 'days_to_maturity', 'season': 'season'}
+# Labels the variety pages use in their text for each characteristic
+LABELS = {'tomato_type': "Tomato Type", 'breed': "Breed", 'origin': "Origin", 'season': "Season",
+          'leaf_type': "Leaf Type", 'plant_type': "Plant Type", 'plant_height': "Plant Height",
+          'fruit_size': "Fruit Size", 'fruit_shape': "Fruit Shape", 'skin_color': "Skin Color",
+          'flesh_color': "Flesh Color", 'taste': "Taste", 'comments': "Comments",
+          'days_to_maturity': "Days to Maturity", 'disease_resistance': "Disease Resistance",
+          'crack_resistance': "Crack Resistance"}
+
+DESCRIPTION_SENTENCES = (
+    "A {adjective} {type} tomato with {color} fruit.",
+    "Fruits average {size} and ripen {season} in the season.",
+    "Originally from {origin}, it has been grown by home gardeners for generations.",
+    "The flavor is {taste}, with a {texture} texture that is excellent for slicing.",
+    "Plants are {plant} and benefit from staking or caging.",
+    "Yields are {yield_} over a long harvest window.",
+    "Excellent for sauces, salads and fresh eating.",
+    "Seeds were shared through a seed savers' exchange and the variety is now widely available.",
+    "Tolerates heat and humidity better than most {type} varieties.",
+    "A favorite at farmers' markets for its striking appearance.",
+    "Fruit holds well on the vine and stores for a week or more after picking.",
+    "Trial gardens rated it highly for both flavor and productivity.",
+)
+ADJECTIVES = ("productive", "vigorous", "reliable", "old-fashioned", "compact", "prolific",
+              "disease-tolerant", "flavorful", "beautiful", "rare")
+TEXTURES = ("meaty", "juicy", "creamy", "firm", "tender", "dense")
+YIELDS = ("heavy", "moderate", "very heavy", "steady", "good")
+PAGE_HEADER = ("Skip to main content Rutgers University New Jersey Agricultural Experiment "
+               "Station Home Tomato Varieties")
+PAGE_FOOTER = ("Copyright Rutgers, The State University of New Jersey. An equal opportunity "
+               "program provider and employer. Contact Webmaster")
+
+
+def parse_count(value):
+    """Parse a variety count such as 10000, 10k or 1M"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([kKmM]?)', value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid count: {value!r} (try 10k, 100k or 1M)")
+    number, suffix = match.groups()
+    return int(float(number) * {'': 1, 'k': 1000, 'm': 1000000}[suffix.lower()])
+
+
+def count_label(count):
+    """10000 -> '10k', 1000000 -> '1M'"""
+    if count and count % 1000000 == 0:
+        return f'{count // 1000000}M'
+    if count and count % 1000 == 0:
+        return f'{count // 1000}k'
+    return str(count)
+
+
+def slugify(name):
+    """Slug the way the scraper derives it from a variety's link text"""
+    return re.sub(r'[^a-zA-Z0-9\-_]', '-', name.lower()).strip('-')
+
+
+def variety_name(index):
+    """A unique name for the index-th variety
+
+    A multiplicative permutation spreads consecutive indexes over the
+    prefix/core pairs, so even a small catalogue mixes all name parts.
+    """
+    pairs = len(NAME_PREFIXES) * len(NAME_CORES)
+    round_, pair = divmod(index, pairs)
+    # 7919 is prime and does not divide `pairs`, so this is a bijection
+    prefix, core = divmod(pair * 7919 % pairs, len(NAME_CORES))
+    parts = [NAME_PREFIXES[prefix], NAME_CORES[core]]
+    if round_:
+        qualifier_round, qualifier = divmod(round_ - 1, len(NAME_QUALIFIERS))
+        parts.append(NAME_QUALIFIERS[qualifier])
+        if qualifier_round:
+            parts.append(str(qualifier_round + 1))
+    return ' '.join(parts)
+
+
+class VarietyGenerator:
+    """Draws random varieties from the distributions above"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        # field -> (share, values, cumulative weights) for rng.choices
+        self.categorical = {}
+        for field, (share, weights) in CATEGORICAL.items():
+            cumulative = []
+            total = 0
+            for weight in weights.values():
+                total += weight
+                cumulative.append(total)
+            self.categorical[field] = (share, tuple(weights), cumulative)
+
+    def pick(self, field):
+        _, values, cumulative = self.categorical[field]
+        return self.rng.choices(values, cum_weights=cumulative)[0]
+
+    def fruit_size(self, tomato_type):
+        low, high = FRUIT_OUNCES.get(tomato_type, (4, 12))
+        ounces = self.rng.uniform(low, high)
+        if ounces >= 16:
+            pounds = max(1, round(ounces / 16))
+            return f"{pounds}-{pounds + 1} lbs." if self.rng.random() < 0.6 else f"{pounds} lb."
+        if ounces >= 1:
+            size = round(ounces)
+            if self.rng.random() < 0.6:
+                return f"{size}-{size + self.rng.randint(1, 4)} oz."
+            return f"{size} oz."
+        return f"{round(ounces, 1)} oz."
+
+    def days_to_maturity(self, season):
+        low, high = SEASON_DAYS.get(season, (60, 90))
+        days = self.rng.randint(low, high)
+        if self.rng.random() < 0.4:
+            return f"{days}-{days + self.rng.choice((5, 10))}"
+        return str(days)
+
+    def plant_height(self, plant_type):
+        if plant_type in ("Determinate", "Dwarf"):
+            low = self.rng.randint(2, 4)
+        else:
+            low = self.rng.randint(4, 8)
+        return f"{low}-{low + self.rng.randint(1, 3)} ft."
+
+    def characteristics(self):
+        rng = self.rng
+        values = {}
+        for field, (share, _, _) in self.categorical.items():
+            if rng.random() < share:
+                values[field] = self.pick(field)
+        if rng.random() < 0.70:
+            values['plant_height'] = self.plant_height(values.get('plant_type'))
+        if rng.random() < 0.80:
+            values['fruit_size'] = self.fruit_size(values.get('tomato_type'))
+        if rng.random() < 0.85:
+            values['days_to_maturity'] = self.days_to_maturity(values.get('season'))
+        if rng.random() < 0.30:
+            values['disease_resistance'] = ', '.join(
+                sorted(rng.sample(DISEASES, rng.randint(1, 4)), key=DISEASES.index))
+        if rng.random() < 0.25:
+            values['comments'] = rng.choice(DESCRIPTION_SENTENCES[6:]).format(
+                type=values.get('tomato_type', 'heirloom').lower())
+        # Field order as the scraper's patterns find them
+        return {field: values[field] for field in LABELS if field in values}
+
+    def description(self, characteristics):
+        rng = self.rng
+        # Most pages have one to three paragraphs; some have none
+        count = 0 if rng.random() < 0.08 else int(rng.lognormvariate(1.2, 0.6)) + 1
+        sentences = rng.sample(DESCRIPTION_SENTENCES, min(count, len(DESCRIPTION_SENTENCES)))
+        return ' '.join(sentence.format(
+            adjective=rng.choice(ADJECTIVES),
+            type=characteristics.get('tomato_type', 'heirloom').lower(),
+            color=characteristics.get('skin_color', 'red').lower(),
+            size=characteristics.get('fruit_size', '6-8 oz.'),
+            season=characteristics.get('season', 'mid').lower(),
+            origin=characteristics.get('origin', 'the United States'),
+            taste=characteristics.get('taste', 'sweet').lower(),
+            texture=rng.choice(TEXTURES),
+            plant=characteristics.get('plant_type', 'indeterminate').lower(),
+            yield_=rng.choice(YIELDS),
+        ) for sentence in sentences)
+
+    def images(self, name, slug):
+        count = self.rng.choices((0, 1, 2, 3), cum_weights=(40, 80, 95, 100))[0]
+        return [{"url": f"{SOURCE}images/{slug}-{n + 1}.jpg", "alt": name} for n in range(count)]
+
+    def variety(self, index):
+        name = variety_name(index)
+        slug = slugify(name)
+        characteristics = self.characteristics()
+        description = self.description(characteristics)
+        growing_info = {growing: characteristics[field]
+                        for field, growing in CHAR_TO_GROWING.items() if field in characteristics}
+        labelled = ' '.join(f"{LABELS[field]}: {value}" for field, value in characteristics.items())
+        raw_text = f"{PAGE_HEADER} {name} {labelled} {description} {PAGE_FOOTER}"
+        return {
+            "name": name,
+            "url": f"{SOURCE}{slug}/",
+            "description": description,
+            "characteristics": characteristics,
+            "growing_info": growing_info,
+            "images": self.images(name, slug),
+            "raw_text": raw_text,
+            "page_title": f"{name} | Tomato Varieties",
+            "slug": slug,
+        }
+
+
+def write_catalogue(path, count, seed=0, progress_every=100000):
+    """Stream `count` synthetic varieties to `path` as one JSON document
+
+    Writes to a temporary file and renames it into place, so a running API
+    watching `path` never reads a half-written catalogue.
+    """
+    generator = VarietyGenerator(seed)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'{"varieties": [\n')
+        for index in range(count):
+            if index:
+                f.write(b',\n')
+            f.write(serializer.dumps(generator.variety(index)))
+            if progress_every and (index + 1) % progress_every == 0:
+                print(f"   ... {index + 1:,} varieties")
+        f.write(b'\n], ')
+        # The remaining top-level keys, without the encoded object's opening brace
+        f.write(serializer.dumps({
+            "total_count": count,
+            "scraped_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "source": SOURCE,
+            "synthetic": {"seed": seed},
+        })[1:])
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('counts', nargs='+', type=parse_count,
+                        help='varieties per file, e.g. 10k 100k 1M')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (same seed, same file)')
+    parser.add_argument('--output', help='output file (one count only); '
+                                         'default tomato_varieties_<count>.json')
+    args = parser.parse_args()
+
+    if args.output and len(args.counts) > 1:
+        parser.error('--output takes a single count')
+
+    for count in args.counts:
+        path = args.output or f'tomato_varieties_{count_label(count)}.json'
+        print(f"🍅 Generating {count:,} synthetic varieties into {path}...")
+        start = time.time()
+        write_catalogue(path, count, args.seed)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"✅ Wrote {path} ({size_mb:.1f} MB) in {time.time() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
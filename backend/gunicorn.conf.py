@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Gunicorn settings for serving the API in production
+Every setting can be overridden from the environment, e.g.
+TOMATO_WORKERS=8 gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('TOMATO_BIND', '0.0.0.0:5000')
+# Requests are CPU-bound (index lookups and serialization), so one worker per core
+workers = int(os.environ.get('TOMATO_WORKERS', multiprocessing.cpu_count()))
+# gthread even with one thread: the sync worker ignores keepalive
+worker_class = os.environ.get('TOMATO_WORKER_CLASS', 'gthread')
+# Threads per worker; more let one worker serve slow clients concurrently
+threads = int(os.environ.get('TOMATO_THREADS', '1'))
+timeout = int(os.environ.get('TOMATO_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('TOMATO_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('TOMATO_KEEPALIVE', '5'))
+# Recycle workers after this many requests (0 = never) to bound memory growth
+max_requests = int(os.environ.get('TOMATO_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# Import wsgi.py, and with it the dataset and indexes, once in the master
+preload_app = True
+accesslog = os.environ.get('TOMATO_ACCESS_LOG', '-')
+
+
+def post_fork(server, worker):
+    """Each worker watches the data file itself: threads do not survive fork"""
+    import api
+    api.start_data_watcher()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Request and dataset metrics in the Prometheus text exposition format
+Every thread records into its own shard without taking a lock; shards are
+only summed when /metrics is scraped, and those of finished threads are
+folded together as new threads register
+"""
+
+import math
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the histogram buckets (Prometheus "le" labels)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Registered shards before finished threads' shards are folded together
+RETIRE_MIN_SHARDS = 64
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Render a tuple of (name, value) pairs as {name="value",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+class Shard:
+    """Counters and histograms recorded by one thread
+
+    Keys are (metric name, labels). A histogram is a list holding the count
+    of each bucket, then the +Inf bucket, then the sum of observed values.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def merge(self, other):
+        """Add another shard's values into this one
+
+        The owning thread may still be writing: copying a dict or list is
+        a single operation under the GIL, so a scrape sees each update whole.
+        """
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, counts in other.histograms.copy().items():
+            counts = list(counts)
+            mine = self.histograms.get(key)
+            self.histograms[key] = counts if mine is None else [a + b for a, b in zip(mine, counts)]
+
+    def total(self, name):
+        """Sum of a counter across all of its label values"""
+        return sum(value for (metric, _), value in self.counters.items() if metric == name)
+
+
+class MetricsRegistry:
+    """Declared metrics plus the per-thread shards recording them"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        # Shards of threads that have exited; they can no longer change
+        self._retired = Shard()
+        # Fold finished shards when this many are registered, so they stay
+        # bounded even if /metrics is never scraped
+        self._retire_at = RETIRE_MIN_SHARDS
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def counter(self, name, description):
+        self._counters[name] = description
+
+    def histogram(self, name, description, buckets):
+        self._histograms[name] = (description, tuple(buckets))
+
+    def gauge(self, name, description, collect):
+        """Declare a gauge computed at scrape time
+
+        collect(totals) receives the summed Shard and returns a list of
+        (labels, value) pairs.
+        """
+        self._gauges[name] = (description, collect)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._retire_at:
+                    self._retire_finished()
+                    # Doubling the threshold keeps the cost per new thread constant
+                    self._retire_at = max(RETIRE_MIN_SHARDS, 2 * len(self._shards))
+            return shard
+
+    def _retire_finished(self):
+        """Fold the shards of finished threads into _retired (lock held)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retired.merge(shard)
+        self._shards = live
+
+    def increment(self, name, labels=(), amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        buckets = self._histograms[name][1]
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def collect(self):
+        """Sum every thread's shard into one Shard"""
+        with self._lock:
+            self._retire_finished()
+            totals = Shard()
+            totals.merge(self._retired)
+            for _, shard in self._shards:
+                totals.merge(shard)
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        totals = self.collect()
+        lines = []
+
+        for name, description in self._counters.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+            for (metric, labels), value in sorted(totals.counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        for name, (description, buckets) in self._histograms.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for (metric, labels), counts in sorted(totals.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (math.inf,), counts):
+                    cumulative += count
+                    le = (('le', format_value(bound)),)
+                    lines.append(f'{name}_bucket{format_labels(labels + le)} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(counts[-1])}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+        for name, (description, collect) in self._gauges.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+            for labels, value in collect(totals):
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
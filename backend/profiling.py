@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-request profiling for the API
+Requests carrying the admin token in an X-Profile-Token header, or picked at
+the sampling rate, run under cProfile; the top entries by cumulative time
+are kept in memory under an ID returned in the X-Profile-Id response header
+"""
+
+import cProfile
+import hmac
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+# Functions kept per profile, by cumulative time
+TOP_ENTRIES = 40
+# Profiles kept per process; the oldest are dropped first
+MAX_PROFILES = 100
+
+TOKEN_HEADER = 'X-Profile-Token'
+# Reading stored profiles with the token must not profile (and evict) more
+EXCLUDED_PREFIX = '/profiles'
+
+
+def top_entries(profiler, limit):
+    """The `limit` functions with the highest cumulative time, as dicts"""
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        "function": function,
+        "file": filename,
+        "line": line,
+        "calls": calls,
+        "primitive_calls": primitive_calls,
+        "total_time_ms": round(total_time * 1000, 3),
+        "cumulative_time_ms": round(cumulative_time * 1000, 3),
+    } for (filename, line, function), (primitive_calls, calls, total_time, cumulative_time, _)
+        in ranked]
+
+
+class RequestProfiler:
+    """WSGI middleware that profiles selected requests
+
+    Only one request per process is profiled at a time (the interpreter
+    allows a single active profiler); others arriving meanwhile run as
+    usual. A streamed response is profiled up to its first byte only.
+    """
+
+    def __init__(self, wsgi_app, token=None, sample_rate=0.0,
+                 top=TOP_ENTRIES, max_profiles=MAX_PROFILES):
+        self.wsgi_app = wsgi_app
+        self.token = token.encode('utf-8') if token else None
+        self.sample_rate = sample_rate
+        self.top = top
+        self.max_profiles = max_profiles
+        self.profiles = OrderedDict()
+        self._store_lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def authorized(self, header_value):
+        """Whether an X-Profile-Token header value matches the admin token"""
+        return (self.token is not None and header_value is not None and
+                hmac.compare_digest(header_value.encode('latin-1'), self.token))
+
+    def wants_profile(self, environ):
+        if environ.get('PATH_INFO', '').startswith(EXCLUDED_PREFIX):
+            return False
+        if self.authorized(environ.get('HTTP_X_PROFILE_TOKEN')):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.wants_profile(environ) or not self._active.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+
+        profile_id = uuid.uuid4().hex
+        response_status = []
+
+        def profiled_start_response(status, headers, exc_info=None):
+            response_status.append(status)
+            return start_response(status, headers + [('X-Profile-Id', profile_id)], exc_info)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                body = self.wsgi_app(environ, profiled_start_response)
+            finally:
+                profiler.disable()
+        finally:
+            self._active.release()
+        elapsed = time.perf_counter() - started
+
+        query = environ.get('QUERY_STRING')
+        self.store(profile_id, {
+            "id": profile_id,
+            "method": environ.get('REQUEST_METHOD'),
+            "path": environ.get('PATH_INFO', '') + (f'?{query}' if query else ''),
+            "status": response_status[0] if response_status else None,
+            "duration_ms": round(elapsed * 1000, 3),
+            "profiled_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "entries": top_entries(profiler, self.top),
+        })
+        return body
+
+    def store(self, profile_id, profile):
+        with self._store_lock:
+            self.profiles[profile_id] = profile
+            while len(self.profiles) > self.max_profiles:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        return self.profiles.get(profile_id)
+
+    def summaries(self):
+        """Every stored profile without its entries, newest first"""
+        with self._store_lock:
+            profiles = list(self.profiles.values())
+        return [{key: value for key, value in profile.items() if key != 'entries'}
+                for profile in reversed(profiles)]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Numeric range index for free-text variety measurements
+Parses values such as "75-80", "4 ft." or "1-2 lbs." into numeric ranges in a
+common unit at load time and keeps them in sorted arrays, so range filters
+resolve with a binary search instead of a scan plus ad hoc parsing
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+
+from facet_index import ids_bitmap
+
+NUMBER = r"\d+/\d+|\d+(?:\.\d+)?|\.\d+"
+UNIT = r"(?!to\b)[a-z]+|\"|'"
+RANGE_PATTERN = re.compile(
+    rf"(?P<lo>{NUMBER})\s*(?P<lo_unit>{UNIT})?\.?\s*"
+    rf"(?:(?:-|–|to)\s*(?P<hi>{NUMBER})\s*(?P<hi_unit>{UNIT})?)?",
+    re.IGNORECASE)
+
+LENGTH_FACTORS = {'ft': 1, 'feet': 1, 'foot': 1, "'": 1,
+                  'in': 1 / 12, 'inch': 1 / 12, 'inche': 1 / 12, '"': 1 / 12,
+                  'cm': 1 / 30.48, 'm': 3.2808}
+WEIGHT_FACTORS = {'oz': 1, 'ounce': 1, 'lb': 16, 'pound': 16,
+                  'g': 1 / 28.35, 'gram': 1 / 28.35, 'kg': 35.274}
+
+# field -> (unit values are normalized to, factors for other units)
+RANGE_FIELDS = {
+    'days_to_maturity': ('days', {'day': 1}),
+    'plant_height': ('ft', LENGTH_FACTORS),
+    'fruit_size': ('oz', WEIGHT_FACTORS),
+    'fruit_weight': ('oz', WEIGHT_FACTORS),
+}
+
+
+def parse_number(text):
+    """Parse an integer, decimal or simple fraction such as "1/2"."""
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return int(numerator) / int(denominator) if int(denominator) else None
+    return float(text)
+
+
+def unit_factor(unit, factors):
+    """Conversion factor for a unit to the field's base unit, or None if unknown"""
+    if not unit:
+        return None
+    unit = unit.lower()
+    return factors.get(unit) or factors.get(unit.rstrip('s'))
+
+
+def parse_range(text, field):
+    """Parse a measurement into a (low, high) range in the field's base unit
+
+    Returns None when the text holds no number, or a unit the field cannot
+    convert (such as inches for a weight). A missing unit is taken to be the
+    other end's unit, then the field's base unit.
+    """
+    if not isinstance(text, str):
+        return None
+    match = RANGE_PATTERN.search(text)
+    if not match:
+        return None
+
+    factors = RANGE_FIELDS[field][1]
+    lo = parse_number(match.group('lo'))
+    hi = parse_number(match.group('hi')) if match.group('hi') else lo
+    if lo is None or hi is None:
+        return None
+
+    lo_unit = unit_factor(match.group('lo_unit'), factors)
+    hi_unit = unit_factor(match.group('hi_unit'), factors)
+    if ((match.group('lo_unit') and lo_unit is None) or
+            (match.group('hi_unit') and hi_unit is None)):
+        return None
+    lo_factor = lo_unit or hi_unit or 1
+    hi_factor = hi_unit or lo_unit or 1
+
+    lo, hi = lo * lo_factor, hi * hi_factor
+    return (lo, hi) if lo <= hi else (hi, lo)
+
+
+class NumericRange:
+    """Sorted low and high bounds of one field's parsed ranges"""
+
+    def __init__(self, ranges):
+        by_low = sorted((lo, doc_id) for doc_id, (lo, _) in ranges.items())
+        by_high = sorted((hi, doc_id) for doc_id, (_, hi) in ranges.items())
+        self.lows = [value for value, _ in by_low]
+        self.low_ids = [doc_id for _, doc_id in by_low]
+        self.highs = [value for value, _ in by_high]
+        self.high_ids = [doc_id for _, doc_id in by_high]
+
+    @classmethod
+    def from_tables(cls, lows, low_ids, highs, high_ids):
+        """Wrap prebuilt sorted arrays, such as those mapped from a dataset image"""
+        numeric_range = cls.__new__(cls)
+        numeric_range.lows = lows
+        numeric_range.low_ids = low_ids
+        numeric_range.highs = highs
+        numeric_range.high_ids = high_ids
+        return numeric_range
+
+    def __len__(self):
+        return len(self.lows)
+
+    def overlapping(self, minimum=None, maximum=None):
+        """Return ids whose range overlaps [minimum, maximum] (either may be None)"""
+        ids = None
+        if maximum is not None:
+            ids = set(self.low_ids[:bisect_right(self.lows, maximum)])
+        if minimum is not None:
+            above = self.high_ids[bisect_left(self.highs, minimum):]
+            ids = set(above) if ids is None else ids.intersection(above)
+        return ids if ids is not None else set(self.low_ids)
+
+
+class RangeIndex:
+    """Numeric ranges for every RANGE_FIELDS field, built from (doc_id, field, text)
+
+    The first non-empty text seen for a (doc_id, field) pair is the one
+    parsed, so callers list characteristics before growing_info.
+    """
+
+    def __init__(self, entries, size):
+        self.size = size
+        texts = {field: {} for field in RANGE_FIELDS}
+        for doc_id, field, text in entries:
+            if field in texts and text:
+                texts[field].setdefault(doc_id, text)
+
+        self.fields = {}
+        for field, values in texts.items():
+            ranges = {}
+            for doc_id, text in values.items():
+                parsed = parse_range(text, field)
+                if parsed:
+                    ranges[doc_id] = parsed
+            self.fields[field] = NumericRange(ranges)
+
+    @classmethod
+    def from_varieties(cls, varieties):
+        """Build from characteristics, falling back to growing_info like /stats"""
+        entries = ((doc_id, field, variety.get(section, {}).get(field))
+                   for section in ('characteristics', 'growing_info')
+                   for doc_id, variety in enumerate(varieties)
+                   for field in RANGE_FIELDS)
+        return cls(entries, len(varieties))
+
+    @classmethod
+    def from_tables(cls, size, fields):
+        """Wrap a prebuilt NumericRange per field"""
+        index = cls.__new__(cls)
+        index.size = size
+        index.fields = fields
+        return index
+
+    def filter(self, bounds):
+        """Bitmap of the varieties whose ranges overlap every {field: (min, max)} bound
+
+        Varieties without a parsable value for a bounded field never match it.
+        """
+        ids = None
+        for field, (minimum, maximum) in bounds.items():
+            matched = self.fields[field].overlapping(minimum, maximum)
+            ids = matched if ids is None else ids & matched
+        if ids is None:
+            return (1 << self.size) - 1
+        return ids_bitmap(ids, self.size)
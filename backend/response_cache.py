@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Serialized response bodies for one dataset version
+A few hot, catalogue-sized bodies are pinned and always kept; everything else
+lives in an LRU bounded by total body size, so a crawl over many distinct
+URLs can neither push out the hot bodies nor grow memory without limit
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+# Total size of the unpinned bodies kept per dataset version
+MAX_CACHED_BYTES = int(os.environ.get('TOMATO_RESPONSE_CACHE_MB', '64')) * 1024 * 1024
+
+
+class ResponseCache:
+    """Pinned bodies plus a byte-bounded LRU of the rest, keyed by endpoint/args"""
+
+    def __init__(self, max_bytes=MAX_CACHED_BYTES):
+        self.max_bytes = max_bytes
+        self.pinned = {}
+        self.entries = OrderedDict()
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached body for key, or None"""
+        body = self.pinned.get(key)
+        if body is not None:
+            return body
+        with self._lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+        return body
+
+    def put(self, key, body, pinned=False):
+        """Store a body; unpinned bodies evict the least recently used ones to fit"""
+        if pinned:
+            self.pinned[key] = body
+            return
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __contains__(self, key):
+        return key in self.pinned or key in self.entries
+
+    def __len__(self):
+        return len(self.pinned) + len(self.entries)
@@ -6,7 +6,6 @@ Scrapes tomato variety data from Rutgers NJAES website using concurrent threads
 
 import requests
 from bs4 import BeautifulSoup
-import json
 import time
 import re
 from urllib.parse import urljoin, urlparse
@@ -14,6 +13,7 @@ import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from queue import Queue
 import sys
+from serializer import save_json
 
 # Thread-safe printing
 print_lock = threading.Lock()
@@ -328,8 +328,7 @@ def scrape_tomato_varieties_multithreaded(max_workers=5, max_varieties=None):
 def save_to_json(data, filename="tomato_varieties.json"):
     """Save the scraped data to a JSON file"""
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        save_json(data, filename)
         thread_safe_print(f"Data saved to {filename}")
     except Exception as e:
         thread_safe_print(f"Error saving data: {e}")
@@ -6,7 +6,6 @@ Scrapes tomato variety data from Rutgers NJAES website using concurrent threads
 
 import requests
 from bs4 import BeautifulSoup
-import json
 import time
 import re
 from urllib.parse import urljoin, urlparse
@@ -14,6 +13,7 @@ import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 from tqdm import tqdm
+from serializer import save_json
 
 def get_tomato_variety_links(base_url):
     """Get all tomato variety names and their individual page links"""
@@ -332,8 +332,7 @@ def scrape_tomato_varieties_with_progress(max_workers=8, max_varieties=None):
 def save_to_json(data, filename="tomato_varieties.json"):
     """Save the scraped data to a JSON file"""
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        save_json(data, filename)
         print(f"💾 Data saved to {filename}")
     except Exception as e:
         print(f"❌ Error saving data: {e}")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Inverted search index for tomato varieties
+Built once per data load so /search only intersects posting lists instead of
+rescanning every variety on every request
+"""
+
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from facet_index import ids_bitmap, iter_bitmap_ids
+
+TOKEN_PATTERN = re.compile(r'\w+')
+GRAM_SIZE = 3
+
+# BM25 parameters and per-field weights: name matches count three times as much
+BM25_K1 = 1.2
+BM25_B = 0.75
+FIELD_WEIGHTS = {'name': 3.0, 'description': 1.0, 'characteristics': 1.0}
+
+
+def build_searchable_text(variety):
+    """Build the lowercased text /search matches against for a variety"""
+    return ' '.join([
+        variety.get('name', ''),
+        variety.get('description', ''),
+        ' '.join(variety.get('characteristics', {}).values()),
+        ' '.join(variety.get('growing_info', {}).values())
+    ]).lower()
+
+
+def ranked_fields(variety):
+    """Return the text of each BM25 field of a variety"""
+    return {
+        'name': variety.get('name', ''),
+        'description': variety.get('description', ''),
+        'characteristics': ' '.join([
+            ' '.join(variety.get('characteristics', {}).values()),
+            ' '.join(variety.get('growing_info', {}).values())
+        ])
+    }
+
+
+def tokenize(text):
+    """Split lowercased text into word tokens"""
+    return TOKEN_PATTERN.findall(text)
+
+
+def text_grams(text, size):
+    """Return the set of distinct substrings of exactly `size` characters"""
+    if size == 1:
+        return set(text)
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def average_lengths(lengths):
+    """Mean token count of each field, never 0 so BM25 can divide by it"""
+    return {field: (sum(values) / len(values) if values else 0) or 1
+            for field, values in lengths.items()}
+
+
+class SearchIndex:
+    """Token and n-gram posting lists over the searchable text of each variety
+
+    Documents are identified by their position in the varieties list. An
+    n-gram posting is an ascending array of doc ids, or a bitmap (see
+    facet_index.py) once that is smaller, i.e. for grams in more than 1 of
+    every 32 documents. Token postings hold parallel arrays of doc ids and
+    term counts per BM25 field for ranking. The searchable texts are kept as
+    one UTF-8 buffer with offsets rather than as a string per variety.
+    """
+
+    def __init__(self, varieties):
+        self.grams = {}
+        self.tokens = {field: {} for field in FIELD_WEIGHTS}
+        self.lengths = {field: array('I') for field in FIELD_WEIGHTS}
+        self.offsets = array('Q', [0])
+        self.text_base = 0
+        text_buffer = bytearray()
+        grams = self.grams
+        grams_get = grams.get
+
+        doc_id = -1
+        for doc_id, variety in enumerate(varieties):
+            text = build_searchable_text(variety)
+            text_buffer += text.encode('utf-8')
+            self.offsets.append(len(text_buffer))
+
+            for field, field_text in ranked_fields(variety).items():
+                tokens = tokenize(field_text.lower())
+                self.lengths[field].append(len(tokens))
+                postings = self.tokens[field]
+                for token, count in Counter(tokens).items():
+                    posting = postings.get(token)
+                    if posting is None:
+                        posting = postings[token] = (array('I'), array('I'))
+                    posting[0].append(doc_id)
+                    posting[1].append(count)
+
+            # 1- and 2-grams answer short queries, trigrams everything else
+            for size in range(1, GRAM_SIZE + 1):
+                for gram in text_grams(text, size):
+                    posting = grams_get(gram)
+                    if posting is None:
+                        posting = grams[gram] = array('I')
+                    posting.append(doc_id)
+
+        self.size = doc_id + 1
+        self.text = bytes(text_buffer)
+        for gram, posting in self.grams.items():
+            # 4 bytes per id against 1 bit per document
+            if len(posting) * 32 > self.size:
+                self.grams[gram] = ids_bitmap(posting, self.size)
+
+        self.average_lengths = average_lengths(self.lengths)
+
+    @classmethod
+    def from_tables(cls, size, grams, tokens, lengths, text, offsets, text_base=0):
+        """Wrap prebuilt tables, such as those mapped from a dataset image
+
+        `grams` and each `tokens[field]` only need get(); the text may be any
+        buffer with find(), its documents starting at `text_base`.
+        """
+        index = cls.__new__(cls)
+        index.size = size
+        index.grams = grams
+        index.tokens = tokens
+        index.lengths = lengths
+        index.text = text
+        index.offsets = offsets
+        index.text_base = text_base
+        index.average_lengths = average_lengths(lengths)
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def candidates(self, query):
+        """Return the doc ids whose text contains every n-gram of the query"""
+        size = min(len(query), GRAM_SIZE)
+        postings = []
+        for gram in text_grams(query, size):
+            posting = self.grams.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        sparse = sorted((p for p in postings if not isinstance(p, int)), key=len)
+        dense = [p for p in postings if isinstance(p, int)]
+        if not sparse:
+            matches = dense[0]
+            for bits in dense[1:]:
+                matches &= bits
+            return list(iter_bitmap_ids(matches))
+
+        # Filter the shortest array by the others; bitmaps test one bit per id
+        matches = sparse[0]
+        for posting in sparse[1:]:
+            posting = set(posting)
+            matches = [doc_id for doc_id in matches if doc_id in posting]
+            if not matches:
+                return []
+        if dense:
+            bits = dense[0]
+            for other in dense[1:]:
+                bits &= other
+            matches = [doc_id for doc_id in matches if bits >> doc_id & 1]
+        return list(matches)
+
+    def contains(self, doc_id, needle):
+        """Whether a document's searchable text contains the UTF-8 needle"""
+        base = self.text_base
+        return self.text.find(needle, base + self.offsets[doc_id],
+                              base + self.offsets[doc_id + 1]) != -1
+
+    def search(self, query):
+        """Return doc ids whose searchable text contains the query substring"""
+        query = query.lower()
+        if not query:
+            return []
+
+        doc_ids = self.candidates(query)
+        if len(query) <= GRAM_SIZE:
+            # The gram posting list is already exact for short queries
+            return doc_ids
+        # Substrings of the UTF-8 encoding match exactly the substrings of the text
+        needle = query.encode('utf-8')
+        return [doc_id for doc_id in doc_ids if self.contains(doc_id, needle)]
+
+    def scores(self, query, doc_ids):
+        """BM25 score of each doc id for the query's tokens, summed over weighted fields"""
+        total = self.size
+        scores = dict.fromkeys(doc_ids, 0.0)
+        for token in set(tokenize(query.lower())):
+            for field, weight in FIELD_WEIGHTS.items():
+                posting = self.tokens[field].get(token)
+                if not posting:
+                    continue
+                posting_ids, counts = posting
+                idf = math.log(1 + (total - len(posting_ids) + 0.5) / (len(posting_ids) + 0.5))
+                lengths = self.lengths[field]
+                average = self.average_lengths[field]
+                # Walk whichever side is shorter: the postings or the matches
+                if len(posting_ids) < len(scores):
+                    pairs = ((doc_id, count) for doc_id, count in zip(posting_ids, counts)
+                             if doc_id in scores)
+                else:
+                    pairs = self.posting_counts(posting_ids, counts, scores)
+                for doc_id, count in pairs:
+                    norm = count + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / average)
+                    scores[doc_id] += weight * idf * count * (BM25_K1 + 1) / norm
+        return scores
+
+    @staticmethod
+    def posting_counts(posting_ids, counts, doc_ids):
+        """Yield (doc_id, count) for the doc ids present in a sorted posting"""
+        for doc_id in doc_ids:
+            position = bisect_left(posting_ids, doc_id)
+            if position < len(posting_ids) and posting_ids[position] == doc_id:
+                yield doc_id, counts[position]
+
+    def rank(self, query, k):
+        """Return ([(doc_id, score)] for the k best matches, total match count)
+
+        Matches are the substring hits of search(); a heap picks the top k by
+        BM25 score without sorting every match, ties keep catalogue order.
+        """
+        doc_ids = self.search(query)
+        scores = self.scores(query, doc_ids)
+        best = heapq.nsmallest(k, doc_ids, key=lambda doc_id: (-scores[doc_id], doc_id))
+        return [(doc_id, scores[doc_id]) for doc_id in best], len(doc_ids)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+JSON serialization for API responses and scraper output
+Uses orjson when it is installed and the standard library otherwise. Both
+write UTF-8 bytes, compact unless indented, non-ASCII text kept as is, and
+compact variety records serialized as plain objects. The output parses to
+the same values either way, but is not always byte-identical: some floats
+are spelled differently (orjson writes 1e-7 and 1e16 where the stdlib
+writes 1e-07 and 1e+16), and NaN and infinities become null with orjson
+but the non-standard NaN and Infinity with the stdlib
+"""
+
+import json
+
+from variety_store import to_plain
+
+try:
+    import orjson
+except ImportError:
+    # Optional: the stdlib encoder gives equivalent output, only slower
+    orjson = None
+
+BACKEND = 'orjson' if orjson else 'json'
+
+
+def dumps(obj, sort_keys=False, indent=False, default=to_plain):
+    """Serialize obj to UTF-8 JSON bytes; indent=True uses two-space indentation
+
+    `default` converts objects neither encoder handles natively, raising
+    TypeError for anything it cannot convert either. Integers beyond 64 bits,
+    which orjson rejects, are encoded by the stdlib instead.
+    """
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, default=default, sort_keys=sort_keys, ensure_ascii=False,
+                      indent=2 if indent else None,
+                      separators=(',', ': ') if indent else (',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def save_json(data, filename):
+    """Write data to a file as indented JSON"""
+    with open(filename, 'wb') as f:
+        f.write(dumps(data, indent=True))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Single-flight call coalescing
+Concurrent callers of the same operation share one execution and its result
+instead of each repeating the work
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run a function once for all concurrent callers and share its result
+
+    The first caller (the leader) runs the function; callers arriving while
+    it is in flight wait and receive the same result or exception. Once the
+    call finishes, the next caller starts a fresh flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._call = None
+
+    def do(self, fn):
+        with self._lock:
+            call = self._call
+            leader = call is None
+            if leader:
+                call = self._call = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._call = None
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+SQLite storage backend for the Tomato Varieties API
+Converts tomato_varieties.json into an indexed SQLite database with an FTS5
+trigram index, so the API opens a file at startup instead of parsing JSON and
+answers lookups, listings and searches with indexed queries
+
+Build the database with: python sqlite_store.py [tomato_varieties.json] [tomato_varieties.db]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import serializer
+from dataset import data_version, lookup_key, sort_keys
+from facet_index import FACET_FIELDS, FacetIndex
+from fuzzy_index import FuzzyIndex
+from range_index import RANGE_FIELDS, RangeIndex
+from response_cache import ResponseCache
+from search_index import FIELD_WEIGHTS, GRAM_SIZE, build_searchable_text
+from stats import CatalogueStats
+from suggest_index import SuggestIndex
+
+SCALAR_FIELDS = ('name', 'slug', 'url', 'description', 'page_title', 'raw_text')
+MAPPING_FIELDS = ('characteristics', 'growing_info')
+KNOWN_FIELDS = SCALAR_FIELDS + MAPPING_FIELDS + ('images',)
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE varieties (
+    id INTEGER PRIMARY KEY,          -- catalogue position
+    name TEXT,
+    slug TEXT,
+    url TEXT,
+    description TEXT,
+    page_title TEXT,
+    raw_text TEXT,
+    images TEXT,                     -- JSON array
+    extra TEXT,                      -- JSON object of any other fields
+    layout TEXT NOT NULL,            -- JSON array of the record's keys, in order
+    name_key TEXT,
+    slug_key TEXT,
+    sort_key TEXT NOT NULL,
+    sort_name TEXT NOT NULL,
+    sort_tiebreak TEXT NOT NULL
+);
+CREATE INDEX varieties_name_key ON varieties (name_key);
+CREATE INDEX varieties_slug_key ON varieties (slug_key);
+CREATE INDEX varieties_sort ON varieties (sort_key, sort_name, sort_tiebreak);
+CREATE TABLE characteristics (
+    variety_id INTEGER NOT NULL REFERENCES varieties (id),
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (variety_id, position)
+) WITHOUT ROWID;
+CREATE INDEX characteristics_key_value ON characteristics (key, value);
+CREATE TABLE growing_info (
+    variety_id INTEGER NOT NULL REFERENCES varieties (id),
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (variety_id, position)
+) WITHOUT ROWID;
+CREATE INDEX growing_info_key_value ON growing_info (key, value);
+CREATE VIRTUAL TABLE varieties_fts USING fts5 (
+    name, description, search_text, raw_text,
+    tokenize = 'trigram'
+);
+"""
+
+VARIETY_COLUMNS = 'id, ' + ', '.join(SCALAR_FIELDS) + ', images, extra, layout'
+
+
+def build_database(json_path, db_path):
+    """Convert the scraper's JSON file into an SQLite database
+
+    The database is written next to its destination and moved into place
+    atomically, so readers never open a half-written file.
+    """
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    data = serializer.loads(raw)
+    varieties = data.get('varieties', [])
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        meta = {
+            'version': data_version(raw),
+            'total_count': json.dumps(data.get('total_count', 0)),
+            'scraped_at': data.get('scraped_at', ''),
+            'source': data.get('source', ''),
+            'variety_count': str(len(varieties)),
+            'stats': json.dumps(CatalogueStats(varieties).to_dict(), ensure_ascii=False)
+        }
+        conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', meta.items())
+
+        keys = sort_keys(varieties)
+        for doc_id, variety in enumerate(varieties):
+            extra = {k: v for k, v in variety.items() if k not in KNOWN_FIELDS}
+            images = variety.get('images')
+            conn.execute(
+                f'INSERT INTO varieties ({VARIETY_COLUMNS}, name_key, slug_key, sort_key, sort_name, '
+                f'sort_tiebreak) VALUES ({", ".join("?" * 15)})',
+                (doc_id, *(variety.get(field) for field in SCALAR_FIELDS),
+                 json.dumps(images, ensure_ascii=False) if images is not None else None,
+                 json.dumps(extra, ensure_ascii=False) if extra else None,
+                 json.dumps(list(variety)),
+                 lookup_key(variety.get('name')) or None,
+                 lookup_key(variety.get('slug')) or None,
+                 *keys[doc_id]))
+
+            for table in MAPPING_FIELDS:
+                conn.executemany(
+                    f'INSERT INTO {table} (variety_id, position, key, value) VALUES (?, ?, ?, ?)',
+                    [(doc_id, position, key, value)
+                     for position, (key, value) in enumerate(variety.get(table, {}).items())])
+
+            conn.execute(
+                'INSERT INTO varieties_fts (rowid, name, description, search_text, raw_text) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (doc_id, variety.get('name', ''), variety.get('description', ''),
+                 build_searchable_text(variety), variety.get('raw_text', '')))
+
+        conn.commit()
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return len(varieties)
+
+
+def substring_glob(query):
+    """GLOB pattern matching the lowercased query anywhere in search_text
+
+    Wildcards are escaped as one-character classes: unlike LIKE ... ESCAPE,
+    which the trigram index cannot serve, GLOB stays an indexed lookup.
+    """
+    escaped = ''.join(f'[{c}]' if c in '*?[' else c for c in query.lower())
+    return f'*{escaped}*'
+
+
+class SqliteDataset:
+    """Snapshot of one SQLite database file, with the TomatoDataset read interface
+
+    Each thread gets its own read-only connection. If the file is replaced
+    before the API swaps in a new snapshot, threads fall back to the pinned
+    connection opened at construction, which still sees the old file.
+    Connections never cross a fork: a snapshot preloaded by a pre-forking
+    server reopens them in each worker on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pid = os.getpid()
+        self._local = threading.local()
+        # Stat before connecting: if the file is swapped in between, every
+        # thread falls back to the pinned connection and stays consistent
+        self._inode = os.stat(path).st_ino
+        self._pinned = self._connect()
+        self._pinned_lock = threading.Lock()
+
+        meta = dict(self._pinned.execute('SELECT key, value FROM meta'))
+        self.version = meta['version']
+        self.metadata = {
+            "total_count": json.loads(meta['total_count']),
+            "scraped_at": meta['scraped_at'],
+            "source": meta['source']
+        }
+        self.variety_count = int(meta['variety_count'])
+        self.stats_payload = {
+            **json.loads(meta['stats']),
+            "scraped_at": self.metadata['scraped_at'],
+            "source": self.metadata['source']
+        }
+        # Serialized response bodies for this version, keyed by endpoint/args
+        self.response_cache = ResponseCache()
+        # Facet bitmaps are small enough to keep in memory; build them from
+        # the indexed characteristics table instead of the full records
+        self.facet_index = FacetIndex(
+            self._pinned.execute(
+                f'SELECT variety_id, key, value FROM characteristics '
+                f'WHERE key IN ({", ".join("?" * len(FACET_FIELDS))})', FACET_FIELDS),
+            self.variety_count)
+        self.range_index = RangeIndex(
+            (row for table in MAPPING_FIELDS for row in self._pinned.execute(
+                f'SELECT variety_id, key, value FROM {table} '
+                f'WHERE key IN ({", ".join("?" * len(RANGE_FIELDS))})', tuple(RANGE_FIELDS))),
+            self.variety_count)
+        self.fuzzy_index = FuzzyIndex(self._pinned.execute('SELECT id, name, slug FROM varieties'))
+        self.suggest_index = SuggestIndex(
+            self._pinned.execute('SELECT id, name, slug FROM varieties'), self.facet_index)
+
+    def _connect(self):
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _after_fork(self):
+        """Drop the connections inherited from the parent process"""
+        with self._pinned_lock:
+            if self._pid != os.getpid():
+                self._local = threading.local()
+                self._pinned = self._connect()
+                self._pid = os.getpid()
+
+    def _query(self, sql, params=()):
+        """Run a read query on this thread's connection and return all rows"""
+        if self._pid != os.getpid():
+            self._after_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                current_inode = os.stat(self.path).st_ino
+            except OSError:
+                current_inode = None
+            if current_inode == self._inode:
+                conn = self._local.conn = self._connect()
+            else:
+                # The file was replaced under us; stay on the old snapshot
+                with self._pinned_lock:
+                    return self._pinned.execute(sql, params).fetchall()
+        return conn.execute(sql, params).fetchall()
+
+    def _load(self, rows):
+        """Rebuild variety dicts from varieties rows, preserving row order"""
+        if not rows:
+            return []
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join('?' * len(ids))
+        mappings = {}
+        for table in MAPPING_FIELDS:
+            mappings[table] = {}
+            for row in self._query(
+                    f'SELECT variety_id, key, value FROM {table} '
+                    f'WHERE variety_id IN ({placeholders}) ORDER BY variety_id, position', ids):
+                mappings[table].setdefault(row['variety_id'], {})[row['key']] = row['value']
+
+        varieties = []
+        for row in rows:
+            fields = {field: row[field] for field in SCALAR_FIELDS}
+            fields['images'] = json.loads(row['images']) if row['images'] is not None else None
+            for table in MAPPING_FIELDS:
+                fields[table] = mappings[table].get(row['id'], {})
+            extra = json.loads(row['extra']) if row['extra'] else {}
+            varieties.append({key: fields[key] if key in fields else extra[key]
+                              for key in json.loads(row['layout'])})
+        return varieties
+
+    def get_varieties(self, ids):
+        """Fetch varieties by id, keeping the order of `ids`"""
+        varieties = []
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._query(
+                f'SELECT {VARIETY_COLUMNS} FROM varieties '
+                f'WHERE id IN ({", ".join("?" * len(chunk))})', chunk)
+            by_id = {row['id']: row for row in rows}
+            varieties.extend(self._load([by_id[doc_id] for doc_id in chunk if doc_id in by_id]))
+        return varieties
+
+    def __len__(self):
+        return self.variety_count
+
+    def all_varieties(self):
+        """Return every variety in catalogue order"""
+        return self._load(self._query(f'SELECT {VARIETY_COLUMNS} FROM varieties ORDER BY id'))
+
+    def lookup(self, name):
+        """Return the id of the variety whose name or slug matches, or None"""
+        key = lookup_key(name)
+        rows = self._query(
+            'SELECT MIN(id) AS id FROM ('
+            'SELECT id FROM varieties WHERE name_key = ? '
+            'UNION ALL SELECT id FROM varieties WHERE slug_key = ?)', (key, key))
+        return rows[0]['id'] if rows else None
+
+    def variety(self, doc_id):
+        """Return the variety with the given id"""
+        return self.get_varieties([doc_id])[0]
+
+    def find_variety(self, name):
+        """Return the variety whose name or slug matches, or None"""
+        doc_id = self.lookup(name)
+        if doc_id is None:
+            return None
+        return self.variety(doc_id)
+
+    def page(self, limit, after=None):
+        """Return up to `limit` varieties in sort-key order after a key"""
+        if after is None:
+            rows = self._query(
+                f'SELECT {VARIETY_COLUMNS}, sort_key, sort_name, sort_tiebreak FROM varieties '
+                f'ORDER BY sort_key, sort_name, sort_tiebreak LIMIT ?', (limit + 1,))
+        else:
+            rows = self._query(
+                f'SELECT {VARIETY_COLUMNS}, sort_key, sort_name, sort_tiebreak FROM varieties '
+                f'WHERE (sort_key, sort_name, sort_tiebreak) > (?, ?, ?) '
+                f'ORDER BY sort_key, sort_name, sort_tiebreak LIMIT ?', (*after, limit + 1))
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1]['sort_key'], rows[-1]['sort_name'], rows[-1]['sort_tiebreak'])
+        return self._load(rows), next_key
+
+    def search_ids(self, query):
+        """Return the ids of varieties whose searchable text contains the query"""
+        rows = self._query(
+            'SELECT rowid FROM varieties_fts WHERE search_text GLOB ? ORDER BY rowid',
+            (substring_glob(query),))
+        return [row['rowid'] for row in rows]
+
+    def rank(self, query, k):
+        """Return ([(id, score)] for the k most relevant matches, total matches)
+
+        Uses FTS5's bm25() over the trigram index with the same field weights
+        as the in-memory backend. Queries shorter than a trigram cannot be
+        MATCHed and come back unranked in catalogue order.
+        """
+        pattern = substring_glob(query)
+        total = self._query(
+            'SELECT COUNT(*) AS n FROM varieties_fts WHERE search_text GLOB ?',
+            (pattern,))[0]['n']
+        if len(query) < GRAM_SIZE:
+            return [(doc_id, 0.0) for doc_id in self.search_ids(query)[:k]], total
+
+        phrase = '"' + query.replace('"', '""') + '"'
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        rows = self._query(
+            f"SELECT rowid, -bm25(varieties_fts, {weights}, 0.0) AS score FROM varieties_fts "
+            f"WHERE varieties_fts MATCH ? AND search_text GLOB ? "
+            f"ORDER BY score DESC, rowid LIMIT ?",
+            ('{name description search_text}: ' + phrase, pattern, k))
+        return [(row['rowid'], row['score']) for row in rows], total
+
+    def search(self, query):
+        """Return the varieties whose searchable text contains the query"""
+        return self.get_varieties(self.search_ids(query))
+
+
+if __name__ == '__main__':
+    json_path = sys.argv[1] if len(sys.argv) > 1 else 'tomato_varieties.json'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else 'tomato_varieties.db'
+
+    print(f"🗄️  Building {db_path} from {json_path}...")
+    count = build_database(json_path, db_path)
+    print(f"✅ Stored {count} varieties in {db_path}")
@@ -81,8 +81,14 @@ cleanup() {
 trap cleanup SIGINT SIGTERM
 
 # Start the API server in background
-echo "🔧 Starting Python API server (port 5000)..."
-python3 api.py &
+# TOMATO_ENV=production serves with pre-forked gunicorn workers (see gunicorn.conf.py)
+if [ "$TOMATO_ENV" = "production" ]; then
+    echo "🔧 Starting Python API server with gunicorn (port 5000)..."
+    gunicorn -c gunicorn.conf.py wsgi:app &
+else
+    echo "🔧 Starting Python API server (port 5000)..."
+    python3 api.py &
+fi
 API_PID=$!
 
 # Wait a moment for API to start
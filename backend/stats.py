@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Catalogue statistics for the /stats endpoint
+Aggregates are maintained by delta as varieties are added or removed, so a
+refreshed catalogue only pays for the varieties that actually changed
+"""
+
+import re
+from collections import Counter
+
+# Characteristics whose values get a full distribution in /stats
+VALUE_FIELDS = ['tomato_type', 'season', 'origin', 'plant_type']
+DAYS_BUCKET_SIZE = 10
+DAYS_PATTERN = re.compile(r'\d+')
+
+
+def variety_value(variety, field):
+    """Return a characteristic, falling back to growing_info"""
+    value = variety.get('characteristics', {}).get(field)
+    if not value:
+        value = variety.get('growing_info', {}).get(field)
+    return value.strip() if isinstance(value, str) else value
+
+
+def days_bucket(variety):
+    """Return the histogram bucket label for a variety's days to maturity"""
+    days = variety_value(variety, 'days_to_maturity')
+    match = DAYS_PATTERN.search(days) if days else None
+    if not match:
+        return None
+    start = int(match.group()) // DAYS_BUCKET_SIZE * DAYS_BUCKET_SIZE
+    return f"{start}-{start + DAYS_BUCKET_SIZE - 1}"
+
+
+def variety_key(variety):
+    """Identity used to pair up old and new versions of a variety"""
+    return variety.get('slug') or variety.get('name', '')
+
+
+class CatalogueStats:
+    """Field presence counts and value histograms over a set of varieties"""
+
+    def __init__(self, varieties=()):
+        self.total_varieties = 0
+        self.varieties_with_images = 0
+        self.varieties_with_growing_info = 0
+        self.characteristics_stats = Counter()
+        self.growing_info_stats = Counter()
+        self.value_stats = {field: Counter() for field in VALUE_FIELDS}
+        self.days_to_maturity_histogram = Counter()
+
+        for variety in varieties:
+            self.add_variety(variety)
+
+    def copy(self):
+        """Return an independent copy of these aggregates"""
+        clone = CatalogueStats()
+        clone.total_varieties = self.total_varieties
+        clone.varieties_with_images = self.varieties_with_images
+        clone.varieties_with_growing_info = self.varieties_with_growing_info
+        clone.characteristics_stats = self.characteristics_stats.copy()
+        clone.growing_info_stats = self.growing_info_stats.copy()
+        clone.value_stats = {field: counts.copy() for field, counts in self.value_stats.items()}
+        clone.days_to_maturity_histogram = self.days_to_maturity_histogram.copy()
+        return clone
+
+    def _apply(self, variety, delta):
+        self.total_varieties += delta
+        if variety.get('images'):
+            self.varieties_with_images += delta
+        if variety.get('growing_info'):
+            self.varieties_with_growing_info += delta
+
+        self.characteristics_stats.update(
+            {key: delta for key in variety.get('characteristics', {})})
+        self.growing_info_stats.update(
+            {key: delta for key in variety.get('growing_info', {})})
+
+        for field, counts in self.value_stats.items():
+            value = variety_value(variety, field)
+            if value:
+                counts[value] += delta
+
+        bucket = days_bucket(variety)
+        if bucket:
+            self.days_to_maturity_histogram[bucket] += delta
+
+    def add_variety(self, variety):
+        """Count a variety into the aggregates"""
+        self._apply(variety, 1)
+
+    def remove_variety(self, variety):
+        """Take a previously counted variety back out of the aggregates"""
+        self._apply(variety, -1)
+
+    def apply_changes(self, old_varieties, new_varieties):
+        """Update the aggregates from one catalogue version to the next
+
+        Varieties are paired by slug (or name); only those that were added,
+        removed or edited touch the counters. Returns the number of changes.
+        """
+        unmatched = {}
+        for variety in old_varieties:
+            unmatched.setdefault(variety_key(variety), []).append(variety)
+
+        changes = 0
+        for variety in new_varieties:
+            previous = unmatched.get(variety_key(variety))
+            if previous and variety in previous:
+                previous.remove(variety)
+            else:
+                self.add_variety(variety)
+                changes += 1
+
+        for leftovers in unmatched.values():
+            for variety in leftovers:
+                self.remove_variety(variety)
+                changes += 1
+        return changes
+
+    def to_dict(self):
+        """Return the aggregates as a JSON-ready dict"""
+        def positive(counts):
+            return {key: count for key, count in counts.items() if count > 0}
+
+        value_stats = {field: positive(counts) for field, counts in self.value_stats.items()}
+        return {
+            "total_varieties": self.total_varieties,
+            "varieties_with_images": self.varieties_with_images,
+            "varieties_with_growing_info": self.varieties_with_growing_info,
+            "characteristics_stats": positive(self.characteristics_stats),
+            "growing_info_stats": positive(self.growing_info_stats),
+            "value_stats": value_stats,
+            "plant_types": value_stats['plant_type'],
+            "days_to_maturity_histogram": dict(sorted(
+                positive(self.days_to_maturity_histogram).items(),
+                key=lambda item: int(item[0].split('-')[0])))
+        }
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Storage backends for the Tomato Varieties API
+Each backend opens a dataset snapshot from a file; all snapshots expose the
+read interface documented on TomatoDataset, so endpoints never care which
+backend is configured
+"""
+
+import os
+
+import serializer
+from dataset import TomatoDataset, data_version
+from dataset_image import ImageDataset, image_version
+from sqlite_store import SqliteDataset
+
+
+def open_json_dataset(path, previous=None):
+    """Parse the scraper's JSON file into an in-memory TomatoDataset"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    version = data_version(raw)
+    if previous is not None and previous.version == version:
+        # Same bytes on disk: keep the snapshot and its warm caches
+        return previous
+    return TomatoDataset(serializer.loads(raw), previous, version)
+
+
+def open_sqlite_dataset(path, previous=None):
+    """Open a database built by sqlite_store.py without loading it into memory"""
+    current = SqliteDataset(path)
+    if previous is not None and previous.version == current.version:
+        return previous
+    return current
+
+
+def open_image_dataset(path, previous=None):
+    """Map an image built by dataset_image.py; unchanged images keep the old mapping"""
+    if previous is not None and previous.version == image_version(path):
+        return previous
+    return ImageDataset(path)
+
+
+# name -> (opener, default file, hint shown when the file is missing)
+BACKENDS = {
+    'memory': (open_json_dataset, 'tomato_varieties.json',
+               "Please run the scraper first: python scraper.py"),
+    'sqlite': (open_sqlite_dataset, 'tomato_varieties.db',
+               "Please build the database first: python sqlite_store.py"),
+    'mmap': (open_image_dataset, 'tomato_varieties.img',
+             "Please build the image first: python dataset_image.py"),
+}
+
+
+def backend_file(backend):
+    """Return the data file a backend reads, honouring TOMATO_DATA_FILE"""
+    return os.environ.get('TOMATO_DATA_FILE') or BACKENDS[backend][1]
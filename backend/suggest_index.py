@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Prefix completion index for /suggest
+Variety names, slugs, name words and facet values are kept in sorted arrays,
+so a keystroke is answered with a binary search and a short forward scan
+instead of a full /search
+"""
+
+from bisect import bisect_left
+
+from facet_index import popcount
+from fuzzy_index import normalize
+
+# Shortest later word of a name completed on its own ("pur" -> "Cherokee Purple")
+MIN_WORD_LENGTH = 3
+
+
+class SuggestIndex:
+    """Sorted completion keys, searched with bisect
+
+    Completions come in two tiers: names, slugs and facet values that start
+    with the prefix, then varieties with a later name word that does. Within
+    a tier they are in key order.
+    """
+
+    def __init__(self, entries, facet_index):
+        leading = []
+        words = []
+        for doc_id, name, slug in entries:
+            suggestion = ('variety', name, slug)
+            key = normalize(name)
+            leading.append((key, doc_id, suggestion))
+            slug_key = normalize(slug)
+            if slug_key and slug_key != key:
+                leading.append((slug_key, doc_id, suggestion))
+            for position, word in enumerate(key.split()):
+                if position and len(word) >= MIN_WORD_LENGTH:
+                    words.append((f'{word} {key}', doc_id, suggestion))
+
+        for field, values in facet_index.bitmaps.items():
+            for value, bits in values.items():
+                leading.append((normalize(value), -1, ('characteristic', value, field, popcount(bits))))
+
+        self.tiers = []
+        for tier in (leading, words):
+            tier = [entry for entry in tier if entry[0]]
+            tier.sort(key=lambda entry: (entry[0], entry[1]))
+            self.tiers.append(([key for key, _, _ in tier], [item for _, _, item in tier]))
+
+    @classmethod
+    def from_varieties(cls, varieties, facet_index):
+        return cls(((doc_id, v.get('name', ''), v.get('slug', ''))
+                    for doc_id, v in enumerate(varieties)), facet_index)
+
+    @classmethod
+    def from_tables(cls, tiers):
+        """Wrap prebuilt (sorted keys, items) tiers, such as those mapped from a dataset image"""
+        index = cls.__new__(cls)
+        index.tiers = tiers
+        return index
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` completion dicts for the prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        seen = set()
+        results = []
+        for keys, items in self.tiers:
+            position = bisect_left(keys, prefix)
+            while (position < len(keys) and len(results) < limit
+                   and keys[position].startswith(prefix)):
+                item = items[position]
+                position += 1
+                if item in seen:
+                    continue
+                seen.add(item)
+                if item[0] == 'variety':
+                    results.append({"type": "variety", "text": item[1], "slug": item[2]})
+                else:
+                    results.append({"type": "characteristic", "text": item[1],
+                                    "field": item[2], "count": item[3]})
+        return results
@@ -0,0 +1,829 @@
+#!/usr/bin/env python3
+"""
+Tests for the Flask API against a small in-memory catalogue
+Run with: python -m pytest test_api.py
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import api
+import asgi
+import benchmark_api
+import dataset_image
+import generate_catalogue
+import serializer
+import storage
+from dataset import TomatoDataset, parse_fields
+from dataset_image import ImageDataset, build_image
+from facet_index import popcount
+from metrics import RETIRE_MIN_SHARDS, MetricsRegistry
+from profiling import RequestProfiler
+from range_index import parse_range
+from sqlite_store import SqliteDataset, build_database
+from variety_store import VarietyRecord
+
+SAMPLE_DATA = {
+    "varieties": [
+        {
+            "name": "Cherokee Purple",
+            "slug": "cherokee-purple",
+            "description": "Dusky rose heirloom from Tennessee.",
+            "characteristics": {"tomato_type": "Heirloom", "season": "Mid",
+                                "fruit_size": "10-12 oz."},
+            "growing_info": {"days_to_maturity": "80"},
+            "images": [],
+            "raw_text": "Cherokee Purple Tomato Type: Heirloom"
+        },
+        {
+            "name": "Sun Gold",
+            "slug": "sun-gold",
+            "description": "Very sweet orange cherry.",
+            "characteristics": {"tomato_type": "Cherry", "season": "Early",
+                                "breed": "Hybrid", "fruit_size": "0.5 oz."},
+            "growing_info": {"days_to_maturity": "57-65"},
+            "images": [{"url": "https://example.com/sungold.jpg", "alt": "Sun Gold"}],
+            "raw_text": "Sun Gold Tomato Type: Cherry"
+        },
+        {
+            "name": "Brandywine",
+            "slug": "brandywine",
+            "description": "Large pink beefsteak heirloom.",
+            "characteristics": {"tomato_type": "Heirloom", "season": "Late",
+                                "plant_type": "Indeterminate", "fruit_size": "1-2 lbs."},
+            "growing_info": {"plant_type": "Indeterminate", "days_to_maturity": "90-100"},
+            "images": [],
+            "raw_text": "Brandywine Tomato Type: Heirloom"
+        }
+    ],
+    "total_count": 3,
+    "scraped_at": "2024-01-01 12:00:00",
+    "source": "https://njaes.rutgers.edu/tomato-varieties/"
+}
+
+
+def write_data(path, data):
+    """Write a catalogue to tomato_varieties.json in the given directory"""
+    with open(path / 'tomato_varieties.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Flask test client serving SAMPLE_DATA from a temporary directory"""
+    write_data(tmp_path, SAMPLE_DATA)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api, 'dataset', None)
+    return api.app.test_client()
+
+
+def test_search_matches_substrings_across_fields(client):
+    response = client.get('/search?q=heirloom')
+    names = [v['name'] for v in response.get_json()['results']]
+    assert names == ['Cherokee Purple', 'Brandywine']
+
+    # Substring semantics: matches inside words and across field boundaries
+    names = [v['name'] for v in client.get('/search?q=ndyw').get_json()['results']]
+    assert names == ['Brandywine']
+    names = [v['name'] for v in client.get('/search?q=cherry%20early').get_json()['results']]
+    assert names == ['Sun Gold']
+    assert client.get('/search?q=zz').get_json()['total_results'] == 0
+
+
+def test_search_uses_refreshed_data(client, tmp_path):
+    assert client.get('/search?q=roma').get_json()['total_results'] == 0
+
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'].append({"name": "Roma", "slug": "roma", "description": "Paste tomato."})
+    write_data(tmp_path, data)
+    client.get('/refresh')
+
+    results = client.get('/search?q=roma').get_json()['results']
+    assert [v['name'] for v in results] == ['Roma']
+
+
+def test_slow_refresh_finishes_in_the_background(client, tmp_path, monkeypatch):
+    assert client.get('/stats').get_json()['total_varieties'] == 3
+    release = threading.Event()
+
+    class SlowDataset(TomatoDataset):
+        def __init__(self, *args, **kwargs):
+            release.wait(5)  # Indexing a large catalogue
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(storage, 'TomatoDataset', SlowDataset)
+    monkeypatch.setattr(api, 'REFRESH_WAIT', 0.05)
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'] = data['varieties'][:1]
+    write_data(tmp_path, data)
+
+    response = client.get('/refresh')
+    assert response.status_code == 202
+    assert response.get_json()['total_varieties'] == 3
+    assert client.get('/stats').get_json()['total_varieties'] == 3
+
+    release.set()
+    api.refresh_executor.submit(lambda: None).result()
+    assert client.get('/stats').get_json()['total_varieties'] == 1
+
+
+def test_variety_lookup_by_name_or_slug(client):
+    assert client.get('/variety/SUN-GOLD').get_json()['name'] == 'Sun Gold'
+    assert client.get('/variety/cherokee purple').get_json()['slug'] == 'cherokee-purple'
+    assert client.get('/variety/roma').status_code == 404
+
+
+def test_variety_lookup_prefers_first_duplicate(tmp_path, monkeypatch):
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'].append({"name": "Sun-Gold", "slug": "sun-gold-2", "description": "Duplicate"})
+    write_data(tmp_path, data)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api, 'dataset', None)
+
+    client = api.app.test_client()
+    assert client.get('/variety/sun-gold').get_json()['name'] == 'Sun Gold'
+    assert client.get('/variety/sun-gold-2').get_json()['description'] == 'Duplicate'
+    assert api.dataset.name_index.duplicates == {'sun-gold': [1, 3]}
+
+
+def test_stats_include_value_histograms(client):
+    stats = client.get('/stats').get_json()
+    assert stats['total_varieties'] == 3
+    assert stats['varieties_with_images'] == 1
+    assert stats['characteristics_stats']['tomato_type'] == 3
+    assert stats['value_stats']['tomato_type'] == {'Heirloom': 2, 'Cherry': 1}
+    assert stats['days_to_maturity_histogram'] == {'50-59': 1, '80-89': 1, '90-99': 1}
+
+
+def test_stats_update_by_delta_on_refresh(client, tmp_path):
+    client.get('/stats')
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    del data['varieties'][0]
+    data['varieties'][0]['characteristics']['season'] = 'Mid'
+    data['varieties'].append({"name": "Roma", "slug": "roma",
+                              "characteristics": {"tomato_type": "Paste"}})
+    write_data(tmp_path, data)
+    client.get('/refresh')
+
+    fresh = TomatoDataset(data).stats_payload
+    assert client.get('/stats').get_json() == fresh
+    assert fresh['value_stats']['season'] == {'Mid': 1, 'Late': 1}
+
+
+def test_varieties_default_to_summary_projection(client):
+    varieties = client.get('/varieties').get_json()['varieties']
+    assert [v['name'] for v in varieties] == ['Cherokee Purple', 'Sun Gold', 'Brandywine']
+    assert 'raw_text' not in varieties[0] and 'images' not in varieties[0]
+
+    varieties = client.get('/varieties?fields=name,images').get_json()['varieties']
+    assert varieties[1] == {'name': 'Sun Gold', 'images': SAMPLE_DATA['varieties'][1]['images']}
+    assert client.get('/varieties?fields=all').get_json()['varieties'] == SAMPLE_DATA['varieties']
+
+
+def test_varieties_cursor_pagination_survives_refresh(client, tmp_path):
+    first = client.get('/varieties?limit=2&fields=slug').get_json()
+    assert [v['slug'] for v in first['varieties']] == ['brandywine', 'cherokee-purple']
+
+    # A variety inserted before the cursor must not shift the next page
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'].insert(0, {"name": "Amish Paste", "slug": "amish-paste"})
+    write_data(tmp_path, data)
+    client.get('/refresh')
+
+    second = client.get(f"/varieties?limit=2&fields=slug&cursor={first['next_cursor']}").get_json()
+    assert [v['slug'] for v in second['varieties']] == ['sun-gold']
+    assert second['next_cursor'] is None
+
+    assert client.get('/varieties?limit=0').status_code == 400
+    assert client.get('/varieties?limit=2&cursor=not-a-cursor').status_code == 400
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite', 'mmap'])
+def test_cursor_pagination_visits_duplicate_keys_once(client, tmp_path, monkeypatch, backend):
+    # Two varieties share name and slug, and two more are identical copies
+    duplicates = [{"name": "A", "slug": "a", "description": "First"},
+                  {"name": "A", "slug": "a", "description": "Second"},
+                  {"name": "B", "slug": "b"}, {"name": "B", "slug": "b"}, {"name": "C", "slug": "c"}]
+    write_data(tmp_path, {**SAMPLE_DATA, "varieties": duplicates})
+    client.get('/refresh')
+    if backend == 'sqlite':
+        use_sqlite_backend(tmp_path, monkeypatch)
+    elif backend == 'mmap':
+        use_image_backend(tmp_path, monkeypatch)
+
+    seen = []
+    cursor = None
+    while True:
+        page = client.get('/varieties?limit=1&fields=name,description'
+                          + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen += [(v['name'], v.get('description')) for v in page['varieties']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen, key=str) == sorted(
+        [(v['name'], v.get('description')) for v in duplicates], key=str)
+
+
+def test_conditional_requests_get_304_until_refresh(client, tmp_path):
+    response = client.get('/stats')
+    etag = response.headers['ETag']
+    assert client.get('/stats', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/variety/sun-gold', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/varieties').get_data() == client.get('/varieties').get_data()
+
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['source'] = 'elsewhere'
+    write_data(tmp_path, data)
+    client.get('/refresh')
+
+    response = client.get('/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['source'] == 'elsewhere'
+
+
+def test_response_cache_keeps_hot_bodies_when_full(client):
+    gzip_headers = {'Accept-Encoding': 'gzip'}
+    client.get('/varieties?fields=all', headers=gzip_headers)
+    cache = api.dataset.response_cache
+    cache.max_bytes = 4096
+    cached = cache.get((('varieties', None), 'gzip'))
+    assert cached is not None
+
+    # A crawl over many distinct URLs fills the LRU many times over
+    for limit in range(1, 601):
+        assert client.get(f'/varieties?limit={limit}').status_code == 200
+    assert 0 < cache.size <= cache.max_bytes
+    assert ('varieties', parse_fields(''), 1, None) not in cache
+
+    misses = metric_value(client, 'tomato_response_cache_misses_total')
+    response = client.get('/varieties?fields=all', headers=gzip_headers)
+    assert response.get_data() == cached
+    assert metric_value(client, 'tomato_response_cache_misses_total') == misses
+
+
+def test_large_responses_are_precompressed(client):
+    plain = client.get('/varieties?fields=all').get_data()
+    response = client.get('/varieties?fields=all', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain
+
+    # Compressed once per version: repeat requests reuse the same bytes
+    key = (('varieties', None), 'gzip')
+    cached = api.dataset.response_cache.get(key)
+    client.get('/varieties?fields=all', headers={'Accept-Encoding': 'gzip'})
+    assert api.dataset.response_cache.get(key) is cached
+
+    small = client.get('/variety/sun-gold', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_evictable_bodies_are_compressed_cheaply(client, monkeypatch):
+    levels = []
+    compress = gzip.compress
+
+    def recording_compress(body, compresslevel, mtime):
+        levels.append(compresslevel)
+        return compress(body, compresslevel=compresslevel, mtime=mtime)
+
+    monkeypatch.setattr(api.gzip, 'compress', recording_compress)
+    headers = {'Accept-Encoding': 'gzip'}
+    plain = client.get('/varieties?fields=all').get_data()
+    assert gzip.decompress(client.get('/varieties?fields=all', headers=headers).get_data()) == plain
+    paged = client.get('/varieties?fields=all&limit=3', headers=headers)
+    assert paged.headers['Content-Encoding'] == 'gzip'
+    assert levels == [9, 1]
+
+
+def test_compressed_responses_have_their_own_etag(client):
+    plain = client.get('/varieties?fields=all')
+    compressed = client.get('/varieties?fields=all', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+
+    for etag in (plain.headers['ETag'], compressed.headers['ETag']):
+        response = client.get('/varieties?fields=all', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+
+def test_data_watcher_swaps_in_changed_file(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'data_watcher', None)
+    watcher = api.start_data_watcher(interval=3600)
+    try:
+        before = api.dataset
+        assert watcher.poll() is False
+
+        (tmp_path / 'tomato_varieties.json').write_text('{"varieties": [', encoding='utf-8')
+        assert watcher.poll() is False
+        assert api.dataset is before
+
+        data = json.loads(json.dumps(SAMPLE_DATA))
+        data['varieties'] = data['varieties'][:1]
+        write_data(tmp_path, data)
+        assert watcher.poll() is True
+        assert client.get('/stats').get_json()['total_varieties'] == 1
+    finally:
+        watcher.stop()
+
+
+def test_concurrent_first_requests_parse_the_file_once(client, monkeypatch):
+    parses = []
+
+    class CountingDataset(TomatoDataset):
+        def __init__(self, *args, **kwargs):
+            parses.append(1)
+            time.sleep(0.05)  # Widen the window for racing loaders
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(storage, 'TomatoDataset', CountingDataset)
+    thread_count = 200
+    barrier = threading.Barrier(thread_count)
+
+    def first_request(path):
+        barrier.wait()
+        return api.app.test_client().get(path).status_code
+
+    paths = ['/stats', '/varieties', '/variety/sun-gold', '/search?q=red'] * (thread_count // 4)
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        statuses = list(executor.map(first_request, paths))
+
+    assert statuses == [200] * thread_count
+    assert len(parses) == 1
+
+
+def test_varieties_are_stored_as_compact_records(client):
+    client.get('/stats')
+    cherokee, _, brandywine = api.dataset.varieties
+    assert isinstance(cherokee, VarietyRecord)
+    assert cherokee == SAMPLE_DATA['varieties'][0]
+    assert 'page_title' not in cherokee and cherokee.get('page_title') is None
+
+    # Repeated categorical values and key sets are shared, not copied
+    assert cherokee['characteristics']['tomato_type'] is brandywine['characteristics']['tomato_type']
+    assert (cherokee['characteristics']._keys is
+            TomatoDataset(SAMPLE_DATA).varieties[0]['characteristics']._keys)
+
+
+def use_sqlite_backend(tmp_path, monkeypatch):
+    """Build the SQLite database from the current data file and switch the API to it"""
+    build_database(str(tmp_path / 'tomato_varieties.json'), str(tmp_path / 'tomato_varieties.db'))
+    monkeypatch.setattr(api, 'STORAGE_BACKEND', 'sqlite')
+    monkeypatch.setattr(api, 'DATA_FILE', 'tomato_varieties.db')
+    monkeypatch.setattr(api, 'dataset', None)
+
+
+def test_sqlite_cursor_pages_match_memory_backend(client, tmp_path, monkeypatch):
+    first = client.get('/varieties?limit=1&fields=slug').get_json()
+    use_sqlite_backend(tmp_path, monkeypatch)
+    second = client.get(f"/varieties?limit=1&fields=slug&cursor={first['next_cursor']}").get_json()
+    assert [v['slug'] for v in second['varieties']] == ['cherokee-purple']
+
+
+def test_sqlite_search_uses_the_trigram_index(client, tmp_path, monkeypatch):
+    use_sqlite_backend(tmp_path, monkeypatch)
+    current, _ = api.load_dataset()
+    statements = []
+    query = current._query
+
+    def recording_query(sql, params=()):
+        statements.append((sql, params))
+        return query(sql, params)
+
+    monkeypatch.setattr(current, '_query', recording_query)
+    for text in ('heirloom', 'ndyw', 'o', '50%', 'a_b', '*[?\\'):
+        assert current.search_ids(text) == TomatoDataset(SAMPLE_DATA).search_ids(text)
+        current.rank(text, 10)
+
+    plans = [query(f'EXPLAIN QUERY PLAN {sql}', params)[0]['detail']
+             for sql, params in statements if 'search_text' in sql]
+    # "G" is the trigram-accelerated GLOB constraint; without it FTS5 scans every row
+    assert plans and all(re.search(r'VIRTUAL TABLE INDEX \d+:\S*G', plan) for plan in plans)
+
+
+def test_faceted_filter_with_counts(client):
+    response = client.get('/varieties/filter?tomato_type=heirloom&season=Late&season=Mid&fields=name')
+    body = response.get_json()
+    assert [v['name'] for v in body['varieties']] == ['Cherokee Purple', 'Brandywine']
+    assert body['total_results'] == 2
+    # Each facet is counted against the other facets' selections only
+    assert body['facets']['tomato_type'] == {'Heirloom': 2}
+    assert body['facets']['season'] == {'Late': 1, 'Mid': 1}
+
+    body = client.get('/varieties/filter?breed=Hybrid').get_json()
+    assert [v['name'] for v in body['varieties']] == ['Sun Gold']
+    assert body['facets']['breed'] == {'Hybrid': 1}
+    assert client.get('/varieties/filter?tomato_type=Paste').get_json()['total_results'] == 0
+    assert client.get('/varieties/filter?taste=Sweet').status_code == 400
+
+
+def test_numeric_range_filters(client):
+    def names(query):
+        return [v['name'] for v in client.get(f'/varieties/filter?{query}').get_json()['varieties']]
+
+    # Sun Gold 57-65 days, Cherokee Purple 80, Brandywine 90-100
+    assert names('days_to_maturity_max=70') == ['Sun Gold']
+    assert names('days_to_maturity_min=80&days_to_maturity_max=95') == ['Cherokee Purple', 'Brandywine']
+    # 1-2 lbs. is normalized to 16-32 oz.
+    assert names('fruit_size_min=14') == ['Brandywine']
+    assert names('fruit_size_max=1&tomato_type=Cherry') == ['Sun Gold']
+    assert names('plant_height_max=3') == []
+    assert client.get('/varieties/filter?fruit_size_max=big').status_code == 400
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1-2 lbs.', (16, 32)), ('4-6', (4, 6)), ('8 to 12 ounces', (8, 12)),
+    ('3 inches', None), ('10 cm', None), ('2-3 in', None), ('4 oz - 2 inches', None)])
+def test_fruit_size_rejects_units_it_cannot_convert(text, expected):
+    assert parse_range(text, 'fruit_size') == expected
+
+
+def test_fuzzy_search_tolerates_typos(client):
+    assert client.get('/search?q=brandywyne').get_json()['total_results'] == 0
+
+    body = client.get('/search?q=brandywyne&fuzzy=1').get_json()
+    assert [v['name'] for v in body['results']] == ['Brandywine']
+    assert body['fuzzy_results'] == 1 and body['fuzzy_truncated'] is False
+
+    body = client.get('/search?q=Cherokee%20Purpel&fuzzy=1').get_json()
+    assert [v['name'] for v in body['results']] == ['Cherokee Purple']
+    body = client.get('/search?q=sungold&fuzzy=1').get_json()
+    assert [v['name'] for v in body['results']] == ['Sun Gold']
+    assert client.get('/search?q=xylophone&fuzzy=1').get_json()['total_results'] == 0
+
+
+def test_search_ranks_name_matches_first(client, tmp_path, monkeypatch):
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'].append({"name": "Heirloom Rainbow", "slug": "heirloom-rainbow",
+                              "description": "Mixed colours."})
+    write_data(tmp_path, data)
+    client.get('/refresh')
+
+    for backend in ('memory', 'sqlite'):
+        if backend == 'sqlite':
+            use_sqlite_backend(tmp_path, monkeypatch)
+        body = client.get('/search?q=heirloom').get_json()
+        assert body['results'][0]['name'] == 'Heirloom Rainbow'
+        assert body['total_results'] == 3
+        scores = [v['relevance_score'] for v in body['results']]
+        assert scores == sorted(scores, reverse=True) and scores[0] > scores[1]
+
+        page = client.get('/search?q=heirloom&limit=1&offset=1').get_json()
+        assert page['total_results'] == 3
+        assert [v['name'] for v in page['results']] == [body['results'][1]['name']]
+
+    assert client.get('/search?q=heirloom&limit=0').status_code == 400
+    assert client.get('/search?q=heirloom&offset=-1').status_code == 400
+
+
+def test_suggest_completes_names_and_values(client):
+    body = client.get('/suggest?prefix=Che').get_json()
+    assert body['suggestions'] == [
+        {"type": "variety", "text": "Cherokee Purple", "slug": "cherokee-purple"},
+        {"type": "characteristic", "text": "Cherry", "field": "tomato_type", "count": 1}]
+
+    # Later name words and slugs complete too, each variety only once
+    texts = [s['text'] for s in client.get('/suggest?prefix=pur').get_json()['suggestions']]
+    assert texts == ['Cherokee Purple']
+    texts = [s['text'] for s in client.get('/suggest?prefix=sun-g').get_json()['suggestions']]
+    assert texts == ['Sun Gold']
+    assert len(client.get('/suggest?prefix=h&limit=1').get_json()['suggestions']) == 1
+    assert client.get('/suggest?prefix=').status_code == 400
+    assert client.get('/suggest?prefix=h&limit=500').status_code == 400
+
+
+def test_batch_lookup_resolves_names_and_slugs(client, tmp_path, monkeypatch):
+    response = client.post('/varieties/batch',
+                           json={"names": ["sun-gold", "Brandywine", "Roma", "SUN GOLD"]})
+    body = response.get_json()
+    assert [r['found'] for r in body['results']] == [True, True, False, True]
+    assert body['results'][0]['variety'] == SAMPLE_DATA['varieties'][1]
+    assert body['results'][3]['variety']['name'] == 'Sun Gold'
+    assert body['total_found'] == 3 and body['not_found'] == ['Roma']
+
+    body = client.post('/varieties/batch',
+                       json={"names": ["brandywine"], "fields": ["slug"]}).get_json()
+    assert body['results'][0]['variety'] == {"slug": "brandywine"}
+    assert client.post('/varieties/batch', json={"names": "Sun Gold"}).status_code == 400
+    assert client.post('/varieties/batch', data='not json').status_code == 400
+
+    use_sqlite_backend(tmp_path, monkeypatch)
+    assert client.post('/varieties/batch', json={"names": ["sun-gold", "Roma"]}).get_json() == \
+        {"results": [response.get_json()['results'][0], {"name": "Roma", "found": False}],
+         "total_found": 1, "not_found": ["Roma"]}
+
+
+def test_ndjson_export_streams_one_variety_per_line(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'EXPORT_CHUNK_SIZE', 2)
+    response = client.get('/varieties/export.ndjson?fields=all')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == SAMPLE_DATA['varieties']
+
+    response = client.get('/varieties/export.ndjson?tomato_type=Heirloom&days_to_maturity_min=85'
+                          '&fields=slug')
+    assert response.get_data(as_text=True) == '{"slug":"brandywine"}\n'
+    assert client.get('/varieties/export.ndjson?limit=1').status_code == 400
+
+    use_sqlite_backend(tmp_path, monkeypatch)
+    lines = client.get('/varieties/export.ndjson?fields=all').get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == SAMPLE_DATA['varieties']
+
+
+@pytest.mark.skipif(serializer.orjson is None, reason="orjson not installed")
+def test_serializer_output_matches_without_orjson(monkeypatch):
+    payload = {"varieties": TomatoDataset(SAMPLE_DATA).varieties, "note": "Sauté — 🍅",
+               "histogram": {60: 1, 90: 2}, "ratio": 0.5, "missing": None}
+    backends = (serializer.orjson, None)
+    outputs = []
+    for backend in backends:
+        monkeypatch.setattr(serializer, 'orjson', backend)
+        outputs.append([serializer.dumps(payload, sort_keys=True),
+                        serializer.dumps(payload, indent=True)])
+    assert outputs[0] == outputs[1]
+    assert serializer.loads(outputs[0][1])['varieties'] == SAMPLE_DATA['varieties']
+
+    # Edge values may be spelled differently but parse the same; big ints don't fail
+    edges = {"small": 1e-7, "large": 1e16, "huge": 10 ** 30, "negative": -2 ** 70}
+    outputs = []
+    for backend in backends:
+        monkeypatch.setattr(serializer, 'orjson', backend)
+        outputs.append(serializer.dumps(edges, sort_keys=True))
+    assert [json.loads(output) for output in outputs] == [edges, edges]
+
+    # NaN is the documented exception: null with orjson, NaN with the stdlib
+    for backend, output in zip(backends, (b'[null]', b'[NaN]')):
+        monkeypatch.setattr(serializer, 'orjson', backend)
+        assert serializer.dumps([float('nan')]) == output
+
+
+def test_sqlite_dataset_reopens_connections_in_forked_worker(client, tmp_path, monkeypatch):
+    use_sqlite_backend(tmp_path, monkeypatch)
+    current, _ = api.load_dataset()
+    inherited = current._pinned
+    assert current.variety(0)['name'] == 'Cherokee Purple'
+
+    # A preloading server forks after the snapshot was built
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert current.variety(1)['name'] == 'Sun Gold'
+    assert current._pinned is not inherited and current._local.conn is not inherited
+
+
+def test_data_watcher_started_after_fork_picks_up_newer_file(client, tmp_path, monkeypatch):
+    # The master preloads V1, then the file changes before a worker forks
+    monkeypatch.setattr(api, 'data_watcher', None)
+    assert client.get('/stats').get_json()['total_varieties'] == 3
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'] = data['varieties'][:1]
+    write_data(tmp_path, data)
+
+    watcher = api.start_data_watcher(interval=3600)
+    try:
+        assert watcher.poll() is True
+        assert client.get('/stats').get_json()['total_varieties'] == 1
+    finally:
+        watcher.stop()
+
+
+def asgi_request(path, method='GET', body=b'', headers=()):
+    """Drive asgi.app through one request; returns (status, headers, body)"""
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path, 'root_path': '',
+             'query_string': query.encode(), 'headers': list(headers), 'http_version': '1.1'}
+    incoming = [{'type': 'http.request', 'body': body[:4], 'more_body': True},
+                {'type': 'http.request', 'body': body[4:]}]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return (sent[0]['status'], dict(sent[0]['headers']),
+            b''.join(m.get('body', b'') for m in sent[1:]))
+
+
+def test_asgi_app_serves_the_same_endpoints(client):
+    for path in ('/stats', '/search?q=heirloom', '/variety/nope', '/suggest?prefix=su'):
+        expected = client.get(path)
+        status, headers, body = asgi_request(path)
+        assert status == expected.status_code
+        assert headers[b'content-type'] == b'application/json'
+        if 'searched_at' not in expected.get_json():
+            assert body == expected.data
+
+    status, _, body = asgi_request('/varieties/batch', 'POST', b'{"names": ["brandywine"]}',
+                                   [(b'content-type', b'application/json')])
+    assert status == 200 and json.loads(body)['total_found'] == 1
+
+    status, headers, body = asgi_request('/varieties/export.ndjson?fields=slug')
+    assert headers[b'content-type'] == b'application/x-ndjson'
+    assert body.decode().splitlines() == [
+        '{"slug":"cherokee-purple"}', '{"slug":"sun-gold"}', '{"slug":"brandywine"}']
+
+    etag = client.get('/stats').headers['ETag'].encode()
+    assert asgi_request('/stats', headers=[(b'if-none-match', etag)])[0] == 304
+
+
+def use_image_backend(tmp_path, monkeypatch):
+    """Build the dataset image from the current data file and switch the API to it"""
+    build_image(str(tmp_path / 'tomato_varieties.json'), str(tmp_path / 'tomato_varieties.img'))
+    monkeypatch.setattr(api, 'STORAGE_BACKEND', 'mmap')
+    monkeypatch.setattr(api, 'DATA_FILE', 'tomato_varieties.img')
+    monkeypatch.setattr(api, 'dataset', None)
+
+
+@pytest.mark.parametrize('use_backend, dataset_class', [
+    (use_sqlite_backend, SqliteDataset), (use_image_backend, ImageDataset)])
+@pytest.mark.parametrize('path', [
+    '/varieties', '/varieties?fields=all', '/varieties?limit=2&fields=slug',
+    '/variety/SUN-GOLD', '/variety/roma', '/search?q=heirloom', '/search?q=o',
+    '/search?q=50%25', '/search?q=brandywyne&fuzzy=1', '/suggest?prefix=h', '/stats', '/varieties/filter?tomato_type=Heirloom&limit=1',
+    '/varieties/filter?days_to_maturity_max=85&fruit_size_min=4'
+])
+def test_storage_backends_match_memory_backend(client, tmp_path, monkeypatch, path,
+                                               use_backend, dataset_class):
+    expected = client.get(path)
+    use_backend(tmp_path, monkeypatch)
+    actual = client.get(path)
+
+    assert isinstance(api.dataset, dataset_class)
+    assert actual.status_code == expected.status_code
+    expected, actual = expected.get_json(), actual.get_json()
+    if 'searched_at' in expected:
+        del expected['searched_at'], actual['searched_at']
+        if dataset_class is SqliteDataset:
+            # Relevance scores come from a different BM25 implementation
+            for body in (expected, actual):
+                body['results'] = sorted((v['name'] for v in body['results']))
+    assert actual == expected
+
+
+def test_image_backend_pages_and_remaps_on_refresh(client, tmp_path, monkeypatch):
+    first = client.get('/varieties?limit=1&fields=slug').get_json()
+    use_image_backend(tmp_path, monkeypatch)
+    second = client.get(f"/varieties?limit=1&fields=slug&cursor={first['next_cursor']}").get_json()
+    assert [v['slug'] for v in second['varieties']] == ['cherokee-purple']
+
+    # A rebuilt image replaces the file; the next refresh maps the new one
+    old = api.dataset
+    data = json.loads(json.dumps(SAMPLE_DATA))
+    data['varieties'].append({"name": "Roma", "slug": "roma", "description": "Paste tomato."})
+    write_data(tmp_path, data)
+    build_image(str(tmp_path / 'tomato_varieties.json'), str(tmp_path / 'tomato_varieties.img'))
+    assert old.variety(2)['name'] == 'Brandywine'
+    assert client.get('/refresh').get_json()['total_varieties'] == 4
+    assert client.get('/variety/roma').get_json()['name'] == 'Roma'
+    assert old.variety(2)['name'] == 'Brandywine'
+
+
+def test_opening_image_decodes_no_records(client, tmp_path, monkeypatch):
+    use_image_backend(tmp_path, monkeypatch)
+    monkeypatch.setattr(dataset_image, 'decode_record', None)
+    image = ImageDataset(str(tmp_path / 'tomato_varieties.img'))
+
+    matches, facets = image.facet_index.filter({'tomato_type': ['heirloom']})
+    assert popcount(matches) == 2 and facets['tomato_type']['Heirloom'] == 2
+    assert image.fuzzy_index.search('brandywyne')[0] == [(2, 1)]
+    assert image.suggest_index.suggest('sun')[0]['slug'] == 'sun-gold'
+
+
+def metric_value(client, sample):
+    """Value of one sample line (name plus labels) in the /metrics output"""
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        name, _, value = line.rpartition(' ')
+        if name == sample:
+            return float(value)
+    return 0.0
+
+
+def test_metrics_aggregate_requests_across_threads(client):
+    requests_sample = 'tomato_http_requests_total{route="/stats",method="GET",status="200"}'
+    latency_sample = 'tomato_http_request_duration_seconds_count{route="/stats"}'
+    hits_sample = 'tomato_response_cache_hits_total'
+    client.get('/stats')
+    before = [metric_value(client, s) for s in (requests_sample, latency_sample, hits_sample)]
+
+    # Each request runs on its own short-lived thread, as with the threaded dev server
+    threads = [threading.Thread(target=lambda: api.app.test_client().get('/stats'))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = [metric_value(client, s) for s in (requests_sample, latency_sample, hits_sample)]
+    assert [b - a for a, b in zip(before, after)] == [8, 8, 8]
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'tomato_http_response_size_bytes_bucket{route="/stats",le="+Inf"}' in body
+    assert 'tomato_dataset_load_duration_seconds_count{trigger="initial"} ' in body
+    assert metric_value(client, 'tomato_dataset_varieties') == 3
+    assert f'tomato_dataset_info{{version="{api.dataset.version}",backend="memory"}} 1' in body
+
+
+def test_metric_shards_stay_bounded_without_scrapes():
+    registry = MetricsRegistry()
+    registry.counter('tomato_test_total', 'Test counter')
+    for _ in range(RETIRE_MIN_SHARDS * 4):
+        thread = threading.Thread(target=registry.increment, args=('tomato_test_total',))
+        thread.start()
+        thread.join()
+
+    assert len(registry._shards) <= RETIRE_MIN_SHARDS
+    assert registry.collect().total('tomato_test_total') == RETIRE_MIN_SHARDS * 4
+
+
+def test_requests_with_profile_token_are_profiled(client, monkeypatch):
+    assert client.get('/profiles').status_code == 404
+    profiler = RequestProfiler(api.app.wsgi_app, token='secret')
+    monkeypatch.setattr(api, 'profiler', profiler)
+    monkeypatch.setattr(api.app, 'wsgi_app', profiler)
+    admin = {'X-Profile-Token': 'secret'}
+
+    assert 'X-Profile-Id' not in client.get('/stats').headers
+    assert 'X-Profile-Id' not in client.get('/stats', headers={'X-Profile-Token': 'guess'}).headers
+    response = client.get('/search?q=heirloom', headers=admin)
+    assert response.get_json()['total_results'] == 2
+    profile_id = response.headers['X-Profile-Id']
+
+    assert client.get(f'/profiles/{profile_id}').status_code == 403
+    profile = client.get(f'/profiles/{profile_id}', headers=admin).get_json()
+    assert profile['path'] == '/search?q=heirloom' and profile['status'] == '200 OK'
+    functions = [entry['function'] for entry in profile['entries']]
+    assert 'search_varieties' in functions
+    cumulative = [entry['cumulative_time_ms'] for entry in profile['entries']]
+    assert cumulative == sorted(cumulative, reverse=True)
+
+    summaries = client.get('/profiles', headers=admin).get_json()['profiles']
+    assert [p['id'] for p in summaries] == [profile_id] and 'entries' not in summaries[0]
+    assert client.get('/profiles/missing', headers=admin).status_code == 404
+
+
+def test_sampled_profiles_are_not_served_without_a_token(client, monkeypatch):
+    profiler = RequestProfiler(api.app.wsgi_app, sample_rate=1.0)
+    monkeypatch.setattr(api, 'profiler', profiler)
+    monkeypatch.setattr(api.app, 'wsgi_app', profiler)
+
+    profile_id = client.get('/stats').headers['X-Profile-Id']
+    assert client.get('/profiles').status_code == 403
+    assert client.get(f'/profiles/{profile_id}').status_code == 403
+
+
+def test_load_benchmark_replays_a_repeatable_query_mix(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'STORAGE_BACKEND', api.STORAGE_BACKEND)
+    monkeypatch.setattr(api, 'DATA_FILE', api.DATA_FILE)
+    varieties, _ = benchmark_api.load_size(SAMPLE_DATA, 30, 'memory', str(tmp_path))
+    assert len({v['name'] for v in varieties}) == 30
+    assert client.get('/stats').get_json()['total_varieties'] == 30
+    paths = benchmark_api.build_query_mix(varieties, 200, seed=7)
+    assert paths == benchmark_api.build_query_mix(varieties, 200, seed=7)
+    assert {endpoint for endpoint, _ in paths} == {e for e, _ in benchmark_api.QUERY_MIX}
+    assert {path for endpoint, path in paths if endpoint == '/varieties'} == {'/varieties'}
+
+    result = benchmark_api.run_level(benchmark_api.client_sender, paths, concurrency=4)
+    assert result['requests'] == 200 and result['errors'] == 0
+    latency = result['latency_ms']
+    assert 0 < latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+    assert sum(e['requests'] for e in result['endpoints'].values()) == 200
+
+    # Only the deliberately unknown names miss; every other lookup is found
+    lookups = [path for endpoint, path in paths if endpoint == '/variety/<name>']
+    missing = sum('/no-such-variety-' in path for path in lookups)
+    assert result['endpoints']['/variety/<name>']['statuses'] == {
+        '200': len(lookups) - missing, '404': missing}
+    for endpoint in ('/search', '/varieties?limit=50', '/varieties/filter', '/varieties', '/stats'):
+        assert set(result['endpoints'][endpoint]['statuses']) == {'200'}
+
+
+def test_synthetic_catalogue_loads_like_scraped_data(client, tmp_path):
+    path = tmp_path / 'tomato_varieties.json'
+    generate_catalogue.write_catalogue(str(path), 400, seed=5, progress_every=0)
+    data = json.loads(path.read_text(encoding='utf-8'))
+    varieties = data['varieties']
+    assert data['total_count'] == 400 and len({v['name'] for v in varieties}) == 400
+    assert set(varieties[0]) >= set(SAMPLE_DATA['varieties'][0])
+    copy = tmp_path / 'copy.json'
+    generate_catalogue.write_catalogue(str(copy), 400, seed=5, progress_every=0)
+    assert json.loads(copy.read_text(encoding='utf-8'))['varieties'] == varieties
+
+    client.get('/refresh')
+    assert client.get('/stats').get_json()['total_varieties'] == 400
+    heirlooms = client.get('/varieties/filter?tomato_type=Heirloom').get_json()
+    assert 0 < heirlooms['total_results'] < 400
+    early = client.get('/varieties/filter?days_to_maturity_max=65').get_json()
+    assert 0 < early['total_results'] < 400
+    name = varieties[7]['name']
+    assert client.get(f"/variety/{varieties[7]['slug']}").get_json()['name'] == name
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory representation of tomato varieties
+Records use __slots__ instead of per-variety dicts, characteristic maps share
+one interned key tuple per distinct key set, and categorical values such as
+"Heirloom" or "Indeterminate" are interned so each distinct string is stored once
+"""
+
+import sys
+from collections.abc import Mapping
+
+# Top-level variety fields written by the scrapers; anything else goes to _extra
+VARIETY_FIELDS = ('name', 'slug', 'url', 'description', 'page_title',
+                  'characteristics', 'growing_info', 'images', 'raw_text')
+MISSING = object()
+
+# Shared key tuples, one per distinct key set seen in characteristics/images
+_key_schemas = {}
+
+
+def intern_value(value):
+    """Intern strings so repeated categorical values share one object"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def intern_schema(keys):
+    """Return the shared tuple for a sequence of interned keys"""
+    keys = tuple(sys.intern(key) for key in keys)
+    return _key_schemas.setdefault(keys, keys)
+
+
+class CompactDict(Mapping):
+    """Read-only mapping of a shared key tuple to a tuple of values"""
+
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, mapping):
+        self._keys = intern_schema(mapping.keys())
+        self._values = tuple(intern_value(value) for value in mapping.values())
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def values(self):
+        return self._values
+
+    def __eq__(self, other):
+        if isinstance(other, CompactDict):
+            return self._keys == other._keys and self._values == other._values
+        return Mapping.__eq__(self, other)
+
+    def __repr__(self):
+        return f"CompactDict({dict(self)!r})"
+
+
+class VarietyRecord(Mapping):
+    """One tomato variety, readable like the scraper's dict but with fixed slots"""
+
+    __slots__ = VARIETY_FIELDS + ('_extra',)
+
+    def __init__(self, variety):
+        for field in VARIETY_FIELDS:
+            value = variety.get(field, MISSING)
+            if field in ('characteristics', 'growing_info') and isinstance(value, dict):
+                value = CompactDict(value)
+            elif field == 'images' and isinstance(value, list):
+                value = tuple(CompactDict(image) if isinstance(image, dict) else image
+                              for image in value)
+            elif field != 'raw_text':
+                value = intern_value(value)
+            setattr(self, field, value)
+
+        extra = {key: value for key, value in variety.items() if key not in VARIETY_FIELDS}
+        self._extra = extra or None
+
+    def __getitem__(self, key):
+        if key in VARIETY_FIELDS:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for field in VARIETY_FIELDS:
+            if getattr(self, field) is not MISSING:
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def as_dict(self):
+        """Return the variety as the plain dict the scraper wrote"""
+        variety = dict(self)
+        for field in ('characteristics', 'growing_info'):
+            if isinstance(variety.get(field), CompactDict):
+                variety[field] = dict(variety[field])
+        if isinstance(variety.get('images'), tuple):
+            variety['images'] = [dict(image) if isinstance(image, CompactDict) else image
+                                 for image in variety['images']]
+        return variety
+
+    def __eq__(self, other):
+        if isinstance(other, VarietyRecord):
+            return (all(getattr(self, field) == getattr(other, field) for field in VARIETY_FIELDS)
+                    and self._extra == other._extra)
+        if isinstance(other, Mapping):
+            return self.as_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"VarietyRecord({self.name!r})"
+
+
+def to_plain(value):
+    """JSON `default` hook: turn compact mappings back into dicts"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
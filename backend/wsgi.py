@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Production WSGI entry point for the Tomato Varieties API
+Loads the dataset and builds its indexes at import time, so a pre-forking
+server started with preload (see gunicorn.conf.py) does the work once in the
+master and every worker shares those pages copy-on-write
+
+Run with: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+
+import api
+from api import app
+
+current, error = api.load_dataset()
+if error:
+    # Keep serving: endpoints report the error and the watcher retries
+    print(f"⚠️  {error['error']}: {error['message']}")
+else:
+    print(f"✅ Preloaded {len(current)} varieties from {api.DATA_FILE}")
+
+# Move everything loaded so far out of the collector's reach; otherwise the
+# first collection in each worker writes to every object and un-shares the pages
+gc.freeze()
@@ -33,18 +33,39 @@ function initializeApp() {
 function initializeSearch() {
     const searchForms = document.querySelectorAll('form[action="/search"]');
     
-    searchForms.forEach(form => {
+    searchForms.forEach((form, index) => {
         const searchInput = form.querySelector('input[name="q"]');
         
         if (searchInput) {
-            // Add search suggestions (if we had a suggestions endpoint)
-            searchInput.addEventListener('input', debounce(function(e) {
+            // Search-as-you-type suggestions from the /suggest endpoint
+            const suggestionList = document.createElement('datalist');
+            suggestionList.id = `search-suggestions-${index}`;
+            form.appendChild(suggestionList);
+            searchInput.setAttribute('list', suggestionList.id);
+            searchInput.setAttribute('autocomplete', 'off');
+            
+            searchInput.addEventListener('input', debounce(async function(e) {
                 const query = e.target.value.trim();
-                if (query.length >= 2) {
-                    // Could implement live search suggestions here
-                    console.log('Searching for:', query);
+                if (query.length < 2) {
+                    suggestionList.innerHTML = '';
+                    return;
+                }
+                try {
+                    const response = await fetch(`/api/suggest?prefix=${encodeURIComponent(query)}`);
+                    const data = await response.json();
+                    suggestionList.innerHTML = '';
+                    (data.suggestions || []).forEach(suggestion => {
+                        const option = document.createElement('option');
+                        option.value = suggestion.text;
+                        if (suggestion.type === 'characteristic') {
+                            option.label = `${suggestion.field.replace(/_/g, ' ')} (${suggestion.count})`;
+                        }
+                        suggestionList.appendChild(option);
+                    });
+                } catch (error) {
+                    // Suggestions are best effort; the search form still works
                 }
-            }, 300));
+            }, 150));
             
             // Handle form submission
             form.addEventListener('submit', function(e) {
@@ -138,10 +138,21 @@ app.get('/loading-demo', (req, res) => {
 
 // API proxy routes (for AJAX calls from frontend)
 app.get('/api/varieties', async (req, res) => {
-    const data = await callAPI('/varieties');
+    const query = new URLSearchParams(req.query).toString();
+    const data = await callAPI(`/varieties${query ? `?${query}` : ''}`);
     res.json(data);
 });
 
+app.post('/api/varieties/batch', async (req, res) => {
+    try {
+        const response = await axios.post(`${API_BASE_URL}/varieties/batch`, req.body);
+        res.json(response.data);
+    } catch (error) {
+        console.error('Batch lookup error:', error.message);
+        res.json({ error: error.message });
+    }
+});
+
 app.get('/api/varieties/:identifier', async (req, res) => {
     const data = await callAPI(`/variety/${req.params.identifier}`);
     res.json(data);
@@ -153,6 +164,12 @@ app.get('/api/search', async (req, res) => {
     res.json(data);
 });
 
+app.get('/api/suggest', async (req, res) => {
+    const prefix = req.query.prefix || '';
+    const data = await callAPI(`/suggest?prefix=${encodeURIComponent(prefix)}`);
+    res.json(data);
+});
+
 app.get('/api/refresh', async (req, res) => {
     const data = await callAPI('/refresh');
     res.json(data);
@@ -119,10 +119,16 @@ cleanup() {
 trap cleanup SIGINT SIGTERM
 
 # Start the API server in background
-echo "🔧 Starting Python API server (port 5000)..."
+# TOMATO_ENV=production serves with pre-forked gunicorn workers (see backend/gunicorn.conf.py)
 cd backend
 source venv/bin/activate
-python api.py &
+if [ "$TOMATO_ENV" = "production" ]; then
+    echo "🔧 Starting Python API server with gunicorn (port 5000)..."
+    gunicorn -c gunicorn.conf.py wsgi:app &
+else
+    echo "🔧 Starting Python API server (port 5000)..."
+    python api.py &
+fi
 API_PID=$!
 
 # Wait a moment for API to start